@@ -1,5 +1,5 @@
 # backend/app/crawlers/scrape_session.py
-from typing import Dict
+from typing import Dict, Optional
 import aiohttp
 import asyncio
 import certifi
@@ -8,27 +8,49 @@ import os
 
 from .site_profiles import base_url_map, headers_map, cookies_map, cmd_map
 
+# 未指定 HSD 時（一般網址下載）共用的 session key
+DEFAULT_SESSION_KEY = "_default"
+
+# certifi CA bundle 只載入一次，所有 connector 共用
+_SSL_CTX = ssl.create_default_context(cafile=certifi.where())
+
 class SiteSessionManager:
     """ 管理各個HSD的 aiohttp.ClientSession，確保每個HSD只創建一個 Session（Singleton 模式）。 """
     
-    def __init__(self):
+    def __init__(self, max_concurrency: int = 8):
         self._sessions: Dict[str, aiohttp.ClientSession] = {}  # 存放 hsd_name -> aiohttp.ClientSession
         self._lock = asyncio.Lock()
+        self._max_concurrency = max_concurrency  # 每個 host 的連線上限
+
+    async def get_session(self, hsd_name: Optional[str] = None) -> aiohttp.ClientSession:
+        """ 取得指定HSD的 `ClientSession`，如果不存在則創建一個；hsd_name 為 None 時回傳通用 session """
+        key = hsd_name or DEFAULT_SESSION_KEY
 
-    async def get_session(self, hsd_name: str) -> aiohttp.ClientSession:
-        """ 取得指定HSD的 `ClientSession`，如果不存在則創建一個 """
-        async with self._lock:  # 確保只有一個協程能同時進入
-            session = self._sessions.get(hsd_name)
-            if not session or session.closed:
-                self._sessions[hsd_name] = await self._create_session(hsd_name)
-            return self._sessions[hsd_name]
+        # 快速路徑：session 已存在就不搶鎖，讓同時下載可共用連線池
+        session = self._sessions.get(key)
+        if session is not None and not session.closed:
+            return session
+
+        async with self._lock:  # 確保只有一個協程能同時創建
+            session = self._sessions.get(key)
+            if session is None or session.closed:
+                session = self._sessions[key] = await self._create_session(key)
+            return session
+
+    def _new_connector(self) -> aiohttp.TCPConnector:
+        """ 長駐連線池：同 host 重用 keep-alive 連線與 TLS session，DNS 結果快取 5 分鐘 """
+        return aiohttp.TCPConnector(
+            limit=100,
+            limit_per_host=self._max_concurrency,
+            ttl_dns_cache=300,
+            keepalive_timeout=75,
+            ssl=_SSL_CTX,
+        )
 
     async def _create_session(self, hsd_name: str) -> aiohttp.ClientSession:
         """ 根據HSD需求創建不同的 session """
 
-        # 加上正確的 SSL context，避免系統 CA 過舊
-        ssl_ctx = ssl.create_default_context(cafile=certifi.where())
-        connector = aiohttp.TCPConnector(ssl=ssl_ctx)
+        connector = self._new_connector()
 
         # if hsd_name not in base_url_map:
         #     raise ValueError(f"❌ 錯誤：未支援的HSD `{hsd_name}`")
@@ -133,7 +155,17 @@ class SiteSessionManager:
                 timeout=aiohttp.ClientTimeout(15),
             )
         
+        # 一般網址下載（未指定 HSD）
+        elif hsd_name == DEFAULT_SESSION_KEY:
+            # 不設 total：大檔（上限 MAX_DATASHEET_BYTES）傳得慢也不該整體逾時；
+            # 只限制連線建立與「多久沒收到資料」，卡住的連線照樣會被判逾時
+            return aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=None, connect=10, sock_connect=10, sock_read=60),
+            )
+
         else:
+            await connector.close()
             raise ValueError(f'hsd_name = {hsd_name} is not in [Mouser, Future, Sager, DigiKey, Avnet, Arrow, RS, Farnell]')
 
     async def close_session(self, hsd_name: str):
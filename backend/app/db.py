@@ -1,11 +1,17 @@
-from sqlalchemy import create_engine, event
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 from .settings import settings
 
 DATABASE_URL = f"sqlite:///{settings.SQLITE_PATH}"
+
+# 連線池依背景 worker 併發數配置（再留給 API 請求的餘裕），避免預設 5 條在高併發時排隊等連線。
+# 不開 pool_pre_ping：本機 SQLite 檔案連線不會被遠端斷線，ping 只是每次 checkout 多一趟查詢。
+POOL_SIZE = max(settings.DOWNLOADER_MAX_CONCURRENCY + settings.EXTRACTOR_MAX_CONCURRENCY + 4, 10)
 engine = create_engine(
     DATABASE_URL,
     connect_args={"check_same_thread": False},
+    pool_size=POOL_SIZE,
+    max_overflow=POOL_SIZE,  # API 尖峰時的臨時連線，用完即關
     future=True,
 )
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
@@ -15,9 +21,32 @@ Base = declarative_base()
 def set_sqlite_pragma(dbapi_connection, connection_record):
     cursor = dbapi_connection.cursor()
     cursor.execute("PRAGMA journal_mode=WAL;")
+    # WAL 下 NORMAL 仍保證資料庫一致（斷電最多遺失最後幾筆交易），commit 時不必每次 fsync
+    cursor.execute("PRAGMA synchronous=NORMAL;")
     cursor.execute("PRAGMA foreign_keys=ON;")
     cursor.close()
 
+def migrate_missing_columns() -> None:
+    """
+    create_all 不會替既有資料表補欄位：啟動時比對 models，
+    以 ALTER TABLE ADD COLUMN 補上缺少的欄位（僅限 nullable），並補建缺少的索引。
+    """
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not insp.has_table(table.name):
+                continue
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing:
+                    continue
+                if not col.nullable:
+                    raise RuntimeError(f"cannot auto-migrate NOT NULL column {table.name}.{col.name}")
+                col_type = col.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{col.name}" {col_type}'))
+            for idx in table.indexes:
+                idx.create(conn, checkfirst=True)
+
 def get_db():
     db = SessionLocal()
     try:
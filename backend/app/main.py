@@ -1,6 +1,9 @@
 # backend/app/main.py
 
 from pathlib import Path
+from logging.handlers import QueueHandler, QueueListener
+import logging
+import queue
 from urllib.parse import quote
 from contextlib import asynccontextmanager
 
@@ -12,7 +15,7 @@ from sqlalchemy.orm import Session
 
 from .utils import Utils
 from .settings import settings
-from .db import Base, engine, get_db
+from .db import Base, engine, get_db, migrate_missing_columns
 from .models import FileAsset, ModelItem
 from .routers import files as files_router
 from .routers import tasks as tasks_router
@@ -21,6 +24,7 @@ from .routers import models as models_router
 from .routers import export as export_router
 from .routers import static_proxy as static_proxy_router
 from .services.extractor_worker import extractor_worker
+from .services.openai_service import close_clients as close_openai_clients
 from .services.downloader_worker import downloader_worker
 from .crawlers.scrape_session import aiohttp_hsd_session_manager
 
@@ -28,9 +32,42 @@ BASE_DIR = Path(__file__).resolve().parent
 PROJECT_ROOT = (BASE_DIR.parent).resolve()
 EXTRACT_DIR = settings.WORKSPACE_DIR / "extractions"
 
+def _assert_unique_routes(app: FastAPI) -> None:
+    """開發期檢查：同一 (method, path) 不應被註冊兩次，避免後掛的 router 被先掛的遮蔽。"""
+    seen: set[tuple[str, str]] = set()
+    for route in app.routes:
+        for method in getattr(route, "methods", None) or ():
+            key = (method, route.path)
+            if key in seen:
+                raise RuntimeError(f"duplicate route registered: {method} {route.path}")
+            seen.add(key)
+
+def _start_log_listener() -> tuple[QueueHandler, QueueListener]:
+    """
+    本套件的 logger 改掛 QueueHandler：擷取執行緒 / event loop 只把 record 丟進佇列，
+    寫出 stderr 交給 listener 執行緒，併發擷取時不會在 stderr 的鎖上互卡。
+    """
+    q: queue.SimpleQueue = queue.SimpleQueue()
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+    listener = QueueListener(q, stream, respect_handler_level=True)
+
+    handler = QueueHandler(q)
+    pkg_logger = logging.getLogger(__package__)
+    pkg_logger.addHandler(handler)
+    pkg_logger.setLevel(logging.DEBUG if settings.DEBUG else logging.INFO)
+    pkg_logger.propagate = False
+    listener.start()
+    return handler, listener
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    log_handler, log_listener = _start_log_listener()
     Base.metadata.create_all(bind=engine)
+    migrate_missing_columns()
+
+    if settings.DEBUG:
+        _assert_unique_routes(app)
 
     if settings.DEBUG_DEVTOOLS:
         wk_dir = BASE_DIR / ".well-known" / "appspecific"
@@ -46,8 +83,11 @@ async def lifespan(app: FastAPI):
         yield
     finally:
         await extractor_worker.stop()
+        close_openai_clients()
         await downloader_worker.stop()
         await aiohttp_hsd_session_manager.close_all_sessions()
+        logging.getLogger(__package__).removeHandler(log_handler)
+        log_listener.stop()
 
 app = FastAPI(title="Datasheet 校對系統", lifespan=lifespan)
 
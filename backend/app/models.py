@@ -12,10 +12,17 @@ class FileAsset(Base):
     __tablename__ = "file_asset"
     file_hash   = Column(String, primary_key=True)  # SHA-256
     filename    = Column(String, nullable=False)
-    source_url  = Column(Text, nullable=True)
+    source_url  = Column(Text, nullable=True, index=True)
     size_bytes  = Column(Integer, nullable=True)
     local_path  = Column(Text, nullable=False)
     created_at  = Column(AwareDateTime, nullable=False)
+
+    # 下載時的 HTTP 驗證器（原始 header 值），重抓同一 URL 時做 conditional GET
+    etag            = Column(String, nullable=True)
+    last_modified   = Column(String, nullable=True)
+
+    # 已上傳到 OpenAI 的檔案 id（purpose=user_data，設有到期時間），重跑時沿用
+    openai_file_id  = Column(String, nullable=True)
     
     # 關聯物件（1 ↔ N）
     appearances = relationship(
@@ -8,9 +8,23 @@ from typing import Optional, List
 from ..db import get_db
 from ..models import DownloadTask
 from ..services.downloader_worker import downloader_worker
+from ..utils import Utils
 
 router = APIRouter(prefix="/api/downloads", tags=["downloads"])
 
+# 列表 API 只投影需要的欄位（/api/tasks/download 共用）
+DOWNLOAD_TASK_COLUMNS = (
+    DownloadTask.id,
+    DownloadTask.source_url,
+    DownloadTask.hsd_name,
+    DownloadTask.status,
+    DownloadTask.file_hash,
+    DownloadTask.error,
+    DownloadTask.created_at,
+    DownloadTask.started_at,
+    DownloadTask.completed_at,
+)
+
 @router.post("/enqueue")
 async def enqueue_urls(urls: List[str], hsd_name: Optional[str] = None, db: Session = Depends(get_db)):
     """
@@ -19,19 +33,21 @@ async def enqueue_urls(urls: List[str], hsd_name: Optional[str] = None, db: Sess
     if not urls:
         raise HTTPException(400, "urls cannot be empty")
 
-    created_ids: list[int] = []
     now = datetime.now(timezone.utc)
-    for u in urls:
-        t = DownloadTask(
+    tasks = [
+        DownloadTask(
             source_url=u.strip(),
             hsd_name=hsd_name,
             status="queued",
             created_at=now,
         )
-        db.add(t)
-        db.commit()
-        created_ids.append(t.id)
-        await downloader_worker.enqueue(t.id)
+        for u in urls
+    ]
+    # 一次 commit 建立全部任務，再整批入列
+    db.add_all(tasks)
+    db.commit()
+    created_ids: list[int] = [t.id for t in tasks]
+    await downloader_worker.enqueue_many(created_ids)
 
     return {"queued": len(created_ids), "task_ids": created_ids}
 
@@ -41,24 +57,11 @@ def list_downloads(
     limit: int = Query(200, ge=1, le=1000),
     status: Optional[str] = Query(None, description="Filter: queued/running/success/failed"),
 ):
-    q = db.query(DownloadTask)
+    q = db.query(*DOWNLOAD_TASK_COLUMNS)
     if status:
         q = q.filter(DownloadTask.status == status)
     rows = q.order_by(DownloadTask.id.desc()).limit(limit).all()
-    return [
-        {
-            "id": r.id,
-            "source_url": r.source_url,
-            "hsd_name": r.hsd_name,
-            "status": r.status,
-            "file_hash": r.file_hash,
-            "error": r.error,
-            "created_at": r.created_at.isoformat() if r.created_at else None,
-            "started_at": r.started_at.isoformat() if r.started_at else None,
-            "completed_at": r.completed_at.isoformat() if r.completed_at else None,
-        }
-        for r in rows
-    ]
+    return Utils.orjson_response([r._asdict() for r in rows])
 
 @router.post("/{task_id}/retry")
 async def retry_download(task_id: int, db: Session = Depends(get_db)):
@@ -16,10 +16,12 @@ from urllib.parse import quote
 
 import io
 import csv
-import json
+from operator import attrgetter
+
+import orjson
 
 from ..db import get_db
-from ..models import ModelItem
+from ..models import FileAsset, ModelItem
 
 router = APIRouter(prefix="/api/export", tags=["export"])
 
@@ -73,18 +75,17 @@ def _excel_safe_cell(v: Any) -> str:
     return s
 
 
+def _files_newest_first(m: ModelItem) -> List[FileAsset]:
+    """型號關聯檔案，依建立時間新→舊（FileAsset.created_at 為 NOT NULL）。"""
+    return sorted(m.files or (), key=attrgetter("created_at"), reverse=True)
+
+
 def _serialize_model_to_json(m: ModelItem) -> Dict[str, Any]:
     """JSON 匯出用：與 /api/models/{model_number} 類似，但偏批次匯出格式。"""
     apps = [t.app_tag for t in (m.applications or [])]
 
     files_out: List[Dict[str, Any]] = []
-    try:
-        files_sorted = sorted(list(m.files or []), key=lambda fa: (
-            fa.created_at or 0), reverse=True)
-    except Exception:
-        files_sorted = list(m.files or [])
-
-    for fa in files_sorted:
+    for fa in _files_newest_first(m):
         files_out.append({"file_hash": fa.file_hash, "filename": fa.filename})
 
     return {
@@ -113,11 +114,7 @@ def _serialize_model_to_csv_row(m: ModelItem) -> Dict[str, str]:
     """
     apps = [t.app_tag for t in (m.applications or [])]
 
-    try:
-        files_sorted = sorted(list(m.files or []), key=lambda fa: (
-            fa.created_at or 0), reverse=True)
-    except Exception:
-        files_sorted = list(m.files or [])
+    files_sorted = _files_newest_first(m)
 
     file_hashes = [(fa.file_hash or "") for fa in files_sorted]
     filenames = [(fa.filename or "") for fa in files_sorted]
@@ -135,8 +132,8 @@ def _serialize_model_to_csv_row(m: ModelItem) -> Dict[str, str]:
         "verify_status": (m.verify_status or ""),
         "reviewer": (m.reviewer or ""),
         "reviewed_at": (_dt_to_iso_z(m.reviewed_at) or ""),
-        "file_hashes": json.dumps(file_hashes, ensure_ascii=False),
-        "filenames": json.dumps(filenames, ensure_ascii=False),
+        "file_hashes": orjson.dumps(file_hashes).decode("utf-8"),
+        "filenames": orjson.dumps(filenames).decode("utf-8"),
     }
 
 
@@ -202,7 +199,8 @@ def _csv_stream(rows: Iterable[ModelItem]) -> Iterable[bytes]:
 
 
 def _json_bytes(data: Any) -> bytes:
-    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    # orjson 預設即為緊湊格式、UTF-8 原樣輸出（等同 ensure_ascii=False + separators=(",", ":")）
+    return orjson.dumps(data)
 
 
 def _xlsx_bytes_for_specs(rows: List[ModelItem]) -> io.BytesIO:
@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 from datetime import datetime, timezone
+from operator import attrgetter
 from typing import Optional, List, Dict, Any
 
 from fastapi import APIRouter, Depends, HTTPException, Query
@@ -100,15 +101,8 @@ def get_model(model_number: str, db: Session = Depends(get_db)) -> Dict[str, Any
     if not m:
         raise HTTPException(404, "model not found")
 
-    # 把出現的檔案也回傳（用 association_proxy: m.files）
-    try:
-        files = sorted(
-            list(m.files or []),
-            key=lambda fa: (fa.created_at or datetime.min.replace(tzinfo=timezone.utc)),
-            reverse=True,
-        )
-    except Exception:
-        files = list(m.files or [])
+    # 把出現的檔案也回傳（用 association_proxy: m.files）；FileAsset.created_at 為 NOT NULL
+    files = sorted(m.files or (), key=attrgetter("created_at"), reverse=True)
 
     return {
         "id": m.id,
@@ -193,9 +187,8 @@ def update_model(model_number: str, body: ModelUpsertIn, db: Session = Depends(g
                 changed = True
 
     # verify_status 處理
+    # 合法值已由 ModelUpsertIn 的 Literal 型別驗證（不合法直接 422）
     if body.verify_status is not None:
-        if body.verify_status not in ("unverified", "verified"):
-            raise HTTPException(400, "invalid verify_status")
         m.verify_status = body.verify_status
         if body.verify_status == "verified":
             if body.reviewer is not None:
@@ -205,11 +198,11 @@ def update_model(model_number: str, body: ModelUpsertIn, db: Session = Depends(g
             m.reviewer = None
             m.reviewed_at = None
         changed = True
-    else:
-        if changed and m.verify_status == "verified":
-            m.verify_status = "unverified"
-            m.reviewer = None
-            m.reviewed_at = None
+    elif changed and m.verify_status == "verified":
+        # 改了已驗證型號的欄位：自動退回 unverified
+        m.verify_status = "unverified"
+        m.reviewer = None
+        m.reviewed_at = None
 
     if changed:
         db.commit()
@@ -9,6 +9,8 @@ from ..models import ExtractionTask, DownloadTask, FileAsset
 from ..services.extractor_worker import extractor_worker
 from ..schemas import QueueRequest
 from ..settings import settings
+from ..utils import Utils
+from .downloads import DOWNLOAD_TASK_COLUMNS
 
 router = APIRouter(prefix="/api/tasks", tags=["tasks"])
 
@@ -21,6 +23,31 @@ def _has_extraction_json(file_hash: str) -> bool:
     except Exception:
         return False
 
+# 列表 API 只投影需要的欄位（不載入整個 ORM 物件）
+_EXTRACTION_TASK_COLUMNS = (
+    ExtractionTask.id,
+    ExtractionTask.mode,
+    ExtractionTask.status,
+    ExtractionTask.file_hash,
+    ExtractionTask.file_hashes,
+    ExtractionTask.openai_model,
+    ExtractionTask.service_tier,
+    ExtractionTask.external_ids,
+    ExtractionTask.cost_usd,
+    ExtractionTask.prompt_tokens,
+    ExtractionTask.completion_tokens,
+    ExtractionTask.input_tokens,
+    ExtractionTask.cached_input_tokens,
+    ExtractionTask.output_tokens,
+    ExtractionTask.request_payload_path,
+    ExtractionTask.response_path,
+    ExtractionTask.error,
+    ExtractionTask.created_at,
+    ExtractionTask.submitted_at,
+    ExtractionTask.started_at,
+    ExtractionTask.completed_at,
+)
+
 # ── 入列（向下相容：單/多檔擷取；跳過已存在 JSON 且非 force_rerun）
 @router.post("/queue")
 async def queue_extract(req: QueueRequest, db: Session = Depends(get_db)):
@@ -68,9 +95,11 @@ async def queue_extract(req: QueueRequest, db: Session = Depends(get_db)):
             skipped_hashes.append(h)
             continue
 
-        await extractor_worker.enqueue(h, req.force_rerun)
         queued_hashes.append(h)
 
+    # 存在性/去重檢查完再一次入列（單次 commit + put_nowait）
+    await extractor_worker.enqueue_many(queued_hashes, req.force_rerun)
+
     return {
         "queued": len(queued_hashes),
         "skipped_existing": len(skipped_hashes),
@@ -90,38 +119,14 @@ def list_extraction_tasks(
     status: Optional[str] = Query(None, description="queued/submitted/running/succeeded/failed/canceled"),
     mode: Optional[str] = Query(None, description="sync/batch/background"),
 ):
-    q = db.query(ExtractionTask)
+    q = db.query(*_EXTRACTION_TASK_COLUMNS)
     if status:
         q = q.filter(ExtractionTask.status == status)
     if mode:
         q = q.filter(ExtractionTask.mode == mode)
     rows = q.order_by(ExtractionTask.id.desc()).limit(limit).all()
-    return [
-        {
-            "id": r.id,
-            "mode": r.mode,
-            "status": r.status,
-            "file_hash": r.file_hash,
-            "file_hashes": r.file_hashes,
-            "openai_model": r.openai_model,
-            "service_tier": r.service_tier,
-            "external_ids": r.external_ids,
-            "cost_usd": r.cost_usd,
-            "prompt_tokens": r.prompt_tokens,
-            "completion_tokens": r.completion_tokens,
-            "input_tokens": r.input_tokens,
-            "cached_input_tokens": r.cached_input_tokens,
-            "output_tokens": r.output_tokens,
-            "request_payload_path": r.request_payload_path,
-            "response_path": r.response_path,
-            "error": r.error,
-            "created_at": r.created_at.isoformat() if r.created_at else None,
-            "submitted_at": r.submitted_at.isoformat() if r.submitted_at else None,
-            "started_at": r.started_at.isoformat() if r.started_at else None,
-            "completed_at": r.completed_at.isoformat() if r.completed_at else None,
-        }
-        for r in rows
-    ]
+    # datetime 直接交給 orjson 序列化，不在 Python 端逐列 isoformat()
+    return Utils.orjson_response([r._asdict() for r in rows])
 
 # ── DownloadTask 列表
 @router.get("/download")
@@ -130,21 +135,8 @@ def list_download_tasks(
     limit: int = Query(200, ge=1, le=1000),
     status: Optional[str] = Query(None, description="queued/running/success/failed"),
 ):
-    q = db.query(DownloadTask)
+    q = db.query(*DOWNLOAD_TASK_COLUMNS)
     if status:
         q = q.filter(DownloadTask.status == status)
     rows = q.order_by(DownloadTask.id.desc()).limit(limit).all()
-    return [
-        {
-            "id": r.id,
-            "source_url": r.source_url,
-            "hsd_name": r.hsd_name,
-            "status": r.status,
-            "file_hash": r.file_hash,
-            "error": r.error,
-            "created_at": r.created_at.isoformat() if r.created_at else None,
-            "started_at": r.started_at.isoformat() if r.started_at else None,
-            "completed_at": r.completed_at.isoformat() if r.completed_at else None,
-        }
-        for r in rows
-    ]
+    return Utils.orjson_response([r._asdict() for r in rows])
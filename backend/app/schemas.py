@@ -2,7 +2,7 @@
 
 from datetime import datetime
 from pydantic import BaseModel, Field
-from typing import Optional, List, Any, Dict
+from typing import Optional, List, Any, Dict, Literal
 
 # ── FileAsset
 class FileAssetOut(BaseModel):
@@ -141,7 +141,7 @@ class ModelUpsertIn(BaseModel):
     applications: Optional[List[str]] = None
     dimension: Optional[str] = None
     
-    verify_status: Optional[str] = None      # 'unverified' / 'verified'
+    verify_status: Optional[Literal["unverified", "verified"]] = None
     reviewer: Optional[str] = None
     notes: Optional[str] = None
 
@@ -1,36 +1,48 @@
 # backend/app/services/downloader_worker.py
 from urllib.parse import unquote, urlparse, parse_qs
 from datetime import datetime, timezone
-from urllib.parse import urlparse
-from typing import Optional
+from pathlib import Path
+from typing import Iterable, NamedTuple, Optional
 import traceback
-import posixpath
 import asyncio
 import aiohttp
-import hashlib
-import time
+import logging
+import random
 import re
-import io
 
 from sqlalchemy.orm import Session
 from ..db import SessionLocal
 from ..models import DownloadTask
-from .file_store import persist_bytes_to_store
+from ..settings import settings
+from .file_store import find_revalidatable_asset, new_content_hasher, persist_file_to_store, temp_store_path
 from ..crawlers.scrape_session import aiohttp_hsd_session_manager
 
-_FN_TOKEN = r"[^;]+"
-_QUOTED_FN_RE = re.compile(r'filename="((?:\\.|[^"\\])*)"')
-_UNQUOTED_FN_RE = re.compile(r'filename=([^\s;]+)')
-_FNSTAR_RE = re.compile(r"filename\*\s*=\s*([^']*)'([^']*)'(.+)")  # charset'lang'value
+logger = logging.getLogger(__name__)
+
+# Content-Disposition 檔名：單一 pattern 一次掃描
+#   1~3: filename*=charset'lang'value（RFC 5987 / 6266）
+#   4  : filename="..."（支援跳脫字元）
+#   5  : filename=xxx.pdf（無引號）
+_CD_FILENAME_RE = re.compile(
+    r"filename\*\s*=\s*([^']*)'([^']*)'([^;]+)"
+    r'|filename\s*=\s*"((?:\\.|[^"\\])*)"'
+    r"|filename\s*=\s*([^\s;]+)",
+    re.IGNORECASE,
+)
+_QUOTED_PAIR_RE = re.compile(r"\\(.)")
+_RFC5987_CHARSETS = {"utf-8", "iso-8859-1"}
+
+# 一次 translate：反斜線統一成 "/"（下一步只留最後一段，避免 traversal），
+# Windows 保留字元與控制字元換成 "_"
+_FN_TRANS = str.maketrans({
+    "\\": "/",
+    **{c: "_" for c in ':*?"<>|'},
+    **{chr(i): "_" for i in (*range(32), 127)},
+})
 
 def _sanitize_filename(name: str, default_ext: str | None = None) -> str:
-    # 去掉路徑分隔與控制字元，避免 traversal
-    name = name.replace("\\", "/")
-    name = posixpath.basename(name)
-    name = name.strip().strip(".")  # 去掉前後點與空白
-    # 避免空名
-    if not name:
-        name = "file"
+    name = name.translate(_FN_TRANS).rpartition("/")[2]
+    name = name.strip(" .") or "file"  # 去掉前後點與空白，避免空名
     # 長度限制（自行調整政策）
     if len(name) > 180:
         base, dot, ext = name.rpartition(".")
@@ -40,7 +52,7 @@ def _sanitize_filename(name: str, default_ext: str | None = None) -> str:
         else:
             name = name[:180]
     # 若需要補副檔名
-    if default_ext and "." not in posixpath.basename(name):
+    if default_ext and "." not in name:
         name = f"{name}{default_ext}"
     return name
 
@@ -48,45 +60,29 @@ def _extract_filename_from_content_disposition(cd: str) -> str | None:
     if not cd:
         return None
 
-    # 1) RFC 5987 / 6266：filename*=
-    m = _FNSTAR_RE.search(cd)
-    if m:
-        charset, _lang, value = m.groups()
-        try:
-            # value 是 percent-encoded
-            value_pct = unquote(value)
-            if charset:
-                try:
-                    # 嘗試依 charset decode
-                    value_pct = value_pct.encode("latin-1", "ignore").decode(charset, "ignore")
-                except Exception:
-                    # 解不動就維持 percent-decoded 結果
-                    pass
-            return value_pct
-        except Exception:
-            pass
-
-    # 2) 傳統 filename="..."（支援跳脫字元）
-    m = _QUOTED_FN_RE.search(cd)
-    if m:
-        val = m.group(1)
-        val = val.encode("latin-1", "ignore").decode("utf-8", "ignore")
-        # 取消跳脫的 \" \\ 等
-        val = val.replace(r'\"', '"').replace(r"\\", "\\")
-        return val
-
-    # 3) 無引號 filename=xxx.pdf
-    m = _UNQUOTED_FN_RE.search(cd)
-    if m:
-        val = m.group(1)
-        # 有些伺服器會 percent-encode
-        try:
-            val = unquote(val)
-        except Exception:
-            pass
-        return val
+    plain: str | None = None
+    for m in _CD_FILENAME_RE.finditer(cd):
+        charset, _lang, ext_value, quoted, token = m.groups()
 
-    return None
+        # 1) RFC 5987 / 6266：filename*= 優先於 filename=
+        if ext_value is not None:
+            # value 是 percent-encoded；RFC 5987 只要求支援 UTF-8 / ISO-8859-1
+            charset = (charset or "").strip().lower()
+            encoding = charset if charset in _RFC5987_CHARSETS else "utf-8"
+            return unquote(ext_value.strip(), encoding=encoding, errors="replace")
+
+        if plain is not None:
+            continue
+
+        if quoted is not None:
+            # 2) 傳統 filename="..."：先還原 UTF-8，再取消跳脫的 \" \\ 等
+            val = quoted.encode("latin-1", "ignore").decode("utf-8", "ignore")
+            plain = _QUOTED_PAIR_RE.sub(r"\1", val)
+        else:
+            # 3) 無引號 filename=xxx.pdf；有些伺服器會 percent-encode
+            plain = unquote(token)
+
+    return plain
 
 def _guess_filename(response, url: str) -> str:
     """
@@ -96,21 +92,20 @@ def _guess_filename(response, url: str) -> str:
     # 先從 Content-Disposition 拿
     name = _extract_filename_from_content_disposition(cd) if cd else None
 
-    # 再從 URL 推測
+    # 再從 URL 推測（只 parse 一次）
     if not name:
         parsed = urlparse(url)
-        # 先看 query 內常見參數（有些站用 ?filename=xxx）
-        q = parse_qs(parsed.query)
-        for key in ("filename", "file", "name", "download"):
-            if key in q and q[key]:
-                name = q[key][-1]
-                break
-
-    if not name:
-        # 用 path 最後一段
-        segment = posixpath.basename(urlparse(url).path)
-        # 有些 clean URL 不帶副檔名，保留原樣，後續再補 .pdf
-        name = segment or "datasheet"
+        # 先看 query 內常見參數（有些站用 ?filename=xxx）；沒有 query 就不必 parse_qs
+        if parsed.query:
+            q = parse_qs(parsed.query)
+            for key in ("filename", "file", "name", "download"):
+                if key in q and q[key]:
+                    name = q[key][-1]
+                    break
+
+        if not name:
+            # 用 path 最後一段；有些 clean URL 不帶副檔名，保留原樣，後續再補 .pdf
+            name = parsed.path.rpartition("/")[2] or "datasheet"
 
     # 如果沒有副檔名，但 Content-Type 是 pdf，就補 .pdf
     ct = (response.headers.get("Content-Type") or "").lower()
@@ -122,35 +117,54 @@ def _guess_filename(response, url: str) -> str:
 
 QueueItem = int  # download_task.id
 
-class HashableBytesIO(io.BytesIO):
-    """擴展 io.BytesIO，確保 hash 會根據內容變動"""
-
-    def __init__(self, source=None):
-        self.name: str | None = None
-
-        # 如果 `source` 是 `bytes`，直接初始化
-        if isinstance(source, bytes):
-            super().__init__(source)
-        # 如果 `source` 是 `io.BytesIO` 或 `HashableBytesIO`，複製內容
-        elif isinstance(source, io.BytesIO):
-            super().__init__(source.getvalue())  # 取得 BytesIO 內容
-            if hasattr(source, 'name'):
-                self.name = source.name
-        # 如果是其他 file-like object（如 open() 的結果）
-        elif hasattr(source, 'read'):
-            content = source.read()
-            super().__init__(content)
-            self.name = getattr(source, 'name', None)
-        # 如果 `source` 為 `None`，則初始化為空 `BytesIO`
-        else:
-            super().__init__()
-                 
-    @property
-    def hash(self) -> str:
-        """動態計算 SHA-256 hash"""
-        hasher = hashlib.sha256()
-        hasher.update(self.getvalue())  # 取得內容計算
-        return hasher.hexdigest()
+# 串流下載的讀取塊大小：邊收邊算 hash、邊寫暫存檔，記憶體只佔兩個 chunk（處理中 + 接收中）；
+# 每個 chunk 會切一次 thread，太小則切換成本比 hash/寫檔還高
+_DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+class DownloadFailed(RuntimeError):
+    """重試用盡仍下載失敗；訊息為最後一次錯誤（含 traceback）。"""
+
+class PermanentDownloadError(RuntimeError):
+    """重試也不會成功（4xx、內容為空…）：直接失敗。"""
+
+class TransientDownloadError(RuntimeError):
+    """伺服器暫時性錯誤（5xx、408、429）：可重試。"""
+
+class DatasheetTooLarge(PermanentDownloadError):
+    """回應超過 settings.MAX_DATASHEET_BYTES；重試也不會變小，直接失敗。"""
+
+# 只有這些錯誤值得重試；其餘（4xx、過大、未知 HSD…）第一次就失敗
+_RETRYABLE_ERRORS = (
+    TransientDownloadError,
+    aiohttp.ClientConnectionError,   # 含連線失敗、斷線、ServerTimeoutError
+    aiohttp.ClientPayloadError,      # body 收到一半中斷
+    asyncio.TimeoutError,            # ClientTimeout(total=...)
+)
+_MAX_ATTEMPTS = 4
+_BACKOFF_INITIAL_S = 0.5
+_BACKOFF_MAX_S = 8.0
+
+# 單一 host 連續暫時性失敗達門檻後，冷卻期內同 host 任務直接失敗，不佔住 worker
+_BREAKER_THRESHOLD = 5
+_BREAKER_COOLDOWN_S = 60.0
+
+def _backoff_delay(attempt: int) -> float:
+    """指數退避 + jitter（attempt 從 1 起算）：0.5, 1, 2, 4… 秒，上限 8 秒"""
+    return min(_BACKOFF_MAX_S, _BACKOFF_INITIAL_S * 2 ** (attempt - 1) + random.uniform(0, 1))
+
+class DownloadedDatasheet(NamedTuple):
+    tmp_path: Path      # store/ 底下的暫存檔，入庫時 rename 成 {file_hash}.pdf
+    file_hash: str      # new_content_hasher()（串流計算）
+    filename: str
+    size_bytes: int
+    etag: Optional[str] = None           # 回應的 ETag / Last-Modified，存進 FileAsset 供下次 conditional GET
+    last_modified: Optional[str] = None
+
+class CachedDatasheet(NamedTuple):
+    """同一 URL 先前下載過的檔案與其 HTTP 驗證器；伺服器回 304 時直接沿用 file_hash"""
+    file_hash: str
+    etag: Optional[str]
+    last_modified: Optional[str]
 
 class DownloaderWorker:
     def __init__(self, max_concurrency: int = 3, queue_maxsize: int = 0):
@@ -158,6 +172,8 @@ class DownloaderWorker:
         self._workers: list[asyncio.Task] = []
         self._running = False
         self._max_concurrency = max(1, max_concurrency)
+        self._inflight_urls: dict[str, asyncio.Future[str]] = {}  # source_url -> 進行中的下載（結果為 file_hash）
+        self._breaker: dict[str, tuple[int, float]] = {}
 
     async def start(self) -> None:
         if self._running:
@@ -180,6 +196,21 @@ class DownloaderWorker:
     async def enqueue(self, task_id: int) -> None:
         await self.queue.put(task_id)
 
+    async def enqueue_many(self, task_ids: Iterable[int]) -> int:
+        """
+        批次入列：逐筆從 task_ids（可為 generator，惰性取值）放進 queue。
+        有空位就 put_nowait，只有 queue 滿時才 await put；不為每筆建立 asyncio.Task。
+        回傳入列筆數。
+        """
+        count = 0
+        for task_id in task_ids:
+            try:
+                self.queue.put_nowait(task_id)
+            except asyncio.QueueFull:
+                await self.queue.put(task_id)
+            count += 1
+        return count
+
     async def _worker_loop(self) -> None:
         while True:
             task_id = await self.queue.get()
@@ -189,104 +220,279 @@ class DownloaderWorker:
                 await self._run(task_id)
             except asyncio.CancelledError:
                 return
+            except Exception:
+                # 最後防線：連標記失敗都寫不進 DB 時，記錄後繼續處理下一筆，worker 不能死
+                logger.exception("download task %s crashed", task_id)
             finally:
                 self.queue.task_done()
 
     async def _run(self, task_id: int) -> None:
+        # DB 存取皆為同步 I/O，一律丟到 thread 執行，避免 commit 卡住其他下載協程
+        claimed = await asyncio.to_thread(self._mark_running, task_id)
+        if not claimed:
+            return
+        source_url, hsd_name = claimed
+
+        try:
+            file_hash = await self._fetch_coalesced(source_url, hsd_name)
+            await asyncio.to_thread(self._mark_success, task_id, file_hash)
+        except DownloadFailed as e:
+            await asyncio.to_thread(self._mark_failed, task_id, str(e))
+        except Exception as e:
+            # 非預期錯誤也要把任務標成 failed，不能卡在 running
+            await asyncio.to_thread(self._mark_failed, task_id, f"{e!r}\n{traceback.format_exc()}")
+
+    async def _fetch_coalesced(self, source_url: str, hsd_name: Optional[str]) -> str:
+        """
+        同一 URL 同時只下載一次：後到的任務直接等待進行中的 future，共用結果（file_hash）。
+        用 shield 包住，避免單一等待者被取消時連帶取消共用的下載。
+        """
+        fut = self._inflight_urls.get(source_url)
+        if fut is not None:
+            return await asyncio.shield(fut)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight_urls[source_url] = fut
+        try:
+            file_hash = await self._fetch_with_retries(source_url, hsd_name)
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # 沒有其他等待者時，避免 "exception was never retrieved" 警告
+            raise
+        else:
+            fut.set_result(file_hash)
+            return file_hash
+        finally:
+            self._inflight_urls.pop(source_url, None)
+
+    async def _fetch_with_retries(self, source_url: str, hsd_name: Optional[str]) -> str:
+        """
+        下載並入庫，回傳 file_hash；失敗時丟 DownloadFailed。
+        只重試暫時性錯誤（_RETRYABLE_ERRORS），最多 _MAX_ATTEMPTS 次、指數退避；
+        4xx 等永久性錯誤第一次就失敗。同 host 熔斷中則直接失敗。
+        """
+        host = urlparse(source_url).netloc.lower()
+        cached = await asyncio.to_thread(self._lookup_cached, source_url)
+
+        last_err = None
+        for attempt in range(1, _MAX_ATTEMPTS + 1):
+            self._breaker_check(host)
+            try:
+                datasheet = await self._download_datasheet(datasheet_url=source_url, site_name=hsd_name, cached=cached)
+                if not datasheet:
+                    raise PermanentDownloadError("empty content")
+            except _RETRYABLE_ERRORS as e:
+                self._breaker_record(host, ok=False)
+                last_err = f"{e!r}\n{traceback.format_exc()}"
+                if attempt < _MAX_ATTEMPTS:
+                    # 不可用 time.sleep：會卡住整個 event loop；jitter 避免同站同時重試
+                    await asyncio.sleep(_backoff_delay(attempt))
+                continue
+            except Exception as e:
+                # 伺服器有回應（4xx 等）代表 host 活著，不計入熔斷
+                self._breaker_record(host, ok=True)
+                raise DownloadFailed(f"{e}\n{traceback.format_exc()}") from e
+
+            self._breaker_record(host, ok=True)
+            if isinstance(datasheet, CachedDatasheet):
+                # 304 Not Modified：沿用既有檔案，不傳輸、不 hash、不入庫
+                return datasheet.file_hash
+            try:
+                return await asyncio.to_thread(self._persist_datasheet, datasheet, source_url)
+            except Exception as e:
+                # 入庫失敗（磁碟滿、os.replace 失敗、DB 錯誤）同樣算下載失敗，不重試
+                raise DownloadFailed(f"persist failed: {e!r}\n{traceback.format_exc()}") from e
+
+        raise DownloadFailed(last_err)
+
+    # ─────────────────────────────────────────────────────────
+    # 每個 host 的熔斷器：host -> (連續暫時性失敗次數, 冷卻截止的 loop.time())
+
+    def _breaker_check(self, host: str) -> None:
+        _failures, open_until = self._breaker.get(host, (0, 0.0))
+        remaining = open_until - asyncio.get_running_loop().time()
+        if remaining > 0:
+            raise DownloadFailed(f"circuit open for {host}: too many consecutive failures, retry in {remaining:.0f}s")
+
+    def _breaker_record(self, host: str, ok: bool) -> None:
+        if ok:
+            self._breaker.pop(host, None)
+            return
+        failures, _open_until = self._breaker.get(host, (0, 0.0))
+        failures += 1
+        open_until = 0.0
+        if failures >= _BREAKER_THRESHOLD:
+            open_until = asyncio.get_running_loop().time() + _BREAKER_COOLDOWN_S
+            failures = 0  # 冷卻結束後重新計數（半開：再失敗 _BREAKER_THRESHOLD 次才會再熔斷）
+        self._breaker[host] = (failures, open_until)
+
+    # ─────────────────────────────────────────────────────────
+    # DB 標記（同步；由 _run 以 asyncio.to_thread 呼叫）
+
+    def _mark_running(self, task_id: int) -> tuple[str, Optional[str]] | None:
+        """queued/failed → running；回傳 (source_url, hsd_name)，不可執行則回 None。"""
         db: Session = SessionLocal()
         try:
             t: Optional[DownloadTask] = db.get(DownloadTask, task_id)
             if not t:
-                return
+                return None
             if t.status not in ("queued", "failed"):
-                return
+                return None
 
             t.status = "running"
             t.started_at = datetime.now(timezone.utc)
             t.error = None
             db.commit()
+            return t.source_url, t.hsd_name
+        finally:
+            db.close()
 
-            # 簡單重試
-            attempts, max_retries = 0, 2
-            last_exc = None
-            while attempts <= max_retries:
-                try:
-                    datasheet = await self._download_datasheet(datasheet_url=t.source_url, site_name=t.hsd_name)
-                    if not datasheet:
-                        raise RuntimeError("empty content")
-                    file_hash = await self._persist_sync(db, datasheet.getvalue(), datasheet.name, t)
-                    t.file_hash = file_hash
-                    t.status = "success"
-                    t.completed_at = datetime.now(timezone.utc)
-                    db.commit()
-                    return
-                except Exception as e:
-                    last_exc = e
-                    attempts += 1
-                    time.sleep(0.6 * attempts)
+    def _lookup_cached(self, source_url: str) -> CachedDatasheet | None:
+        db: Session = SessionLocal()
+        try:
+            fa = find_revalidatable_asset(db, source_url)
+            if not fa:
+                return None
+            return CachedDatasheet(fa.file_hash, fa.etag, fa.last_modified)
+        finally:
+            db.close()
 
-            t.status = "failed"
-            t.error = f"{last_exc}\n{traceback.format_exc()}"
+    def _persist_datasheet(self, datasheet: DownloadedDatasheet, source_url: str) -> str:
+        db: Session = SessionLocal()
+        try:
+            # 與 /api/files/upload 共用 store/ 與 FileAsset 的入庫規則
+            return persist_file_to_store(
+                db,
+                datasheet.tmp_path,
+                datasheet.file_hash,
+                datasheet.filename,
+                source_url=source_url,
+                size_bytes=datasheet.size_bytes,
+                etag=datasheet.etag,
+                last_modified=datasheet.last_modified,
+            )
+        finally:
+            db.close()
+
+    def _mark_success(self, task_id: int, file_hash: str) -> None:
+        db: Session = SessionLocal()
+        try:
+            t: Optional[DownloadTask] = db.get(DownloadTask, task_id)
+            if not t:
+                return
+            t.file_hash = file_hash
+            t.status = "success"
             t.completed_at = datetime.now(timezone.utc)
             db.commit()
+        finally:
+            db.close()
 
+    def _mark_failed(self, task_id: int, err: Optional[str]) -> None:
+        db: Session = SessionLocal()
+        try:
+            t: Optional[DownloadTask] = db.get(DownloadTask, task_id)
+            if not t:
+                return
+            t.status = "failed"
+            t.error = err
+            t.completed_at = datetime.now(timezone.utc)
+            db.commit()
         finally:
             db.close()
-            
-    async def _download_datasheet(self, datasheet_url: str, site_name: str | None = None, session: aiohttp.ClientSession | None = None) -> HashableBytesIO | None:
-        if not session and site_name:
-            try:
-                session = await aiohttp_hsd_session_manager.get_session(site_name)
-            except:
-                return None
 
-        async with session.get(datasheet_url) as response:
+    async def _download_datasheet(
+        self,
+        datasheet_url: str,
+        site_name: str | None = None,
+        session: aiohttp.ClientSession | None = None,
+        cached: CachedDatasheet | None = None,
+    ) -> DownloadedDatasheet | CachedDatasheet | None:
+        """
+        串流下載到 store/ 暫存檔。
+        給了 cached 時帶 If-None-Match / If-Modified-Since，伺服器回 304 就直接回傳 cached。
+        """
+        if not session:
+            # 由 manager 回傳該 HSD 的長駐 session（未指定 HSD 時為通用 session），連線池跨下載共用
+            # 未知 HSD（ValueError）不重試；暖機請求的連線錯誤則照一般規則重試
+            session = await aiohttp_hsd_session_manager.get_session(site_name)
+
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        async with session.get(datasheet_url, headers=headers) as response:
+            if response.status == 304 and cached is not None:
+                return cached
+
             if response.status != 200:
                 print(f"⚠️ Failed to download {datasheet_url}, status code: {response.status}")
-                return None
+                if response.status >= 500 or response.status in (408, 429):
+                    raise TransientDownloadError(f"HTTP {response.status}")
+                raise PermanentDownloadError(f"HTTP {response.status}")
 
-            # 檢查 Content-Length 是否為 0
+            # 檢查 Content-Length 是否為 0 / 超過上限（超過就不讀 body，直接斷線）
+            max_bytes = settings.MAX_DATASHEET_BYTES
             content_length = response.headers.get("Content-Length")
-            if content_length and int(content_length) == 0:
-                print(f"⚠️ Warning: {datasheet_url} 下載失敗，Content-Length 為 0！")
-                return None
+            if content_length and content_length.isdigit():
+                if int(content_length) == 0:
+                    print(f"⚠️ Warning: {datasheet_url} 下載失敗，Content-Length 為 0！")
+                    return None
+                if int(content_length) > max_bytes:
+                    response.close()
+                    raise DatasheetTooLarge(f"oversize: Content-Length {content_length} > {max_bytes}")
+
+            filename = _guess_filename(response, datasheet_url)
 
-            # 讀取內容
-            datasheet_bytes = await response.read()
-            if not datasheet_bytes:  # 確保不會是空的
+            # 串流讀取：每個 chunk 的 hash + 寫檔丟到 thread（hashlib/write 皆會釋放 GIL），
+            # 同時 event loop 繼續收下一個 chunk；一次只留一個 pending，保證寫入順序
+            tmp_path = temp_store_path()
+            hasher = new_content_hasher()
+            size = 0
+            try:
+                with open(tmp_path, "wb") as fh:
+                    def absorb(chunk: bytes) -> None:
+                        hasher.update(chunk)
+                        fh.write(chunk)
+
+                    pending: asyncio.Task | None = None
+                    try:
+                        async for chunk in response.content.iter_chunked(_DOWNLOAD_CHUNK_SIZE):
+                            if pending is not None:
+                                await pending
+                            size += len(chunk)
+                            if size > max_bytes:
+                                # 沒給或謊報 Content-Length：邊收邊檢查，超過即中止（未讀完的連線不能重用，直接關閉）
+                                response.close()
+                                raise DatasheetTooLarge(f"oversize: received more than {max_bytes} bytes")
+                            pending = asyncio.create_task(asyncio.to_thread(absorb, chunk))
+                        if pending is not None:
+                            await pending
+                    finally:
+                        # 中途失敗也要等 thread 寫完，才能關檔/刪暫存檔
+                        if pending is not None and not pending.done():
+                            await asyncio.wait([pending])
+            except BaseException:
+                tmp_path.unlink(missing_ok=True)
+                raise
+
+            if not size:  # 確保不會是空的
+                tmp_path.unlink(missing_ok=True)
                 print(f"⚠️ Warning: {datasheet_url} 下載內容為空！")
                 return None
 
-            # 轉換為 BytesIO
-            datasheet_io = io.BytesIO(datasheet_bytes)
-
-            filename = _guess_filename(response, datasheet_url)
+            return DownloadedDatasheet(
+                tmp_path,
+                hasher.hexdigest(),
+                filename,
+                size,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
 
-            # # 嘗試從 Header (`Content-Disposition`) 取得檔名
-            # content_disposition = response.headers.get("Content-Disposition")
-            # filename = None
-            # if content_disposition:
-            #     match = re.search(r'filename="([^"]+)"', content_disposition)
-            #     if match:
-            #         filename = match.group(1)
-
-            # # 如果 Header 沒有檔名，嘗試從 URL 提取
-            # if not filename:
-            #     parsed_url = urlparse(datasheet_url)
-            #     path = parsed_url.path
-            #     possible_filename = path.split("/")[-1]
-            #     if "." in possible_filename:
-            #         filename = possible_filename
-
-            # # 如果以上方法都失敗，使用預設名稱
-            # if not filename:
-            #     filename = "datasheet.pdf"
-
-            datasheet_io.name = filename  # 設定檔案名稱
-            return HashableBytesIO(datasheet_io)
-
-    async def _persist_sync(self, db: Session, content: bytes, filename: str, t: DownloadTask) -> str:
-        # 走跟 /api/files/upload 相同的入庫流程，維持一致性
-        return await persist_bytes_to_store(db, content, filename, source_url=t.source_url)
-
-downloader_worker = DownloaderWorker()
+downloader_worker = DownloaderWorker(max_concurrency=settings.DOWNLOADER_MAX_CONCURRENCY)
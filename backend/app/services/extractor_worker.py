@@ -2,12 +2,14 @@
 
 import asyncio
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Optional, Tuple, Dict
+from typing import Optional, Tuple, Dict, List
 
 from sqlalchemy.orm import Session
 
 from ..db import SessionLocal
+from ..settings import settings
 from ..models import ExtractionTask
 from .openai_service import extract_with_openai
 
@@ -25,8 +27,16 @@ class ExtractorWorker:
         # 關閉流程/中止控制
         self._shutting_down: bool = False
 
-        # 正在執行中的任務：task_id -> asyncio.Task (wrap 的 executor future)
-        self._inflight: Dict[int, asyncio.Task] = {}
+        # 正在執行中的任務：task_id -> asyncio.Future (wrap 的 executor future)
+        self._inflight: Dict[int, asyncio.Future] = {}
+
+        # 已被 stop() 中止的 task_id：執行緒寫回結果前查這裡（記憶體），不必再 db.refresh
+        self._canceled_ids: set[int] = set()
+
+        # 擷取專用執行緒池（不與預設 to_thread 池搶位）。
+        # 不用 ProcessPool：extract_with_openai 幾乎全是等待 OpenAI 的網路 I/O（本地不解析 PDF），
+        # 且 _canceled_ids 必須與 event loop 共享記憶體。
+        self._pool: Optional[ThreadPoolExecutor] = None
 
     # ─────────────────────────────────────────────────────────
     # 啟動/停止
@@ -36,6 +46,8 @@ class ExtractorWorker:
             return
         self._running = True
         self._shutting_down = False
+        self._canceled_ids.clear()
+        self._pool = ThreadPoolExecutor(max_workers=self._max_concurrency, thread_name_prefix="extractor")
         for _ in range(self._max_concurrency):
             self._workers.append(asyncio.create_task(self._worker_loop()))
 
@@ -67,22 +79,31 @@ class ExtractorWorker:
             await self.queue.put((-1, False))
         await asyncio.gather(*self._workers, return_exceptions=True)
         self._workers.clear()
+
+        # 不等逾時中的 OpenAI 呼叫（其結果已由 _canceled_ids 擋下）
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
         self._running = False
 
     async def _cancel_all_queued(self) -> None:
         """
-        取出 queue 中尚未開始的任務（不阻塞），逐一標記 canceled。
+        取出 queue 中尚未開始的任務（不阻塞），逐一標記 canceled（共用同一個 session）。
         """
-        while True:
-            try:
-                task_id, _force = self.queue.get_nowait()
-            except asyncio.QueueEmpty:
-                break
-            try:
-                if task_id != -1:
-                    self._mark_canceled_before_start(task_id)
-            finally:
-                self.queue.task_done()
+        db: Session = SessionLocal()
+        try:
+            while True:
+                try:
+                    task_id, _force = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                try:
+                    if task_id != -1:
+                        self._mark_canceled_before_start(db, task_id)
+                finally:
+                    self.queue.task_done()
+        finally:
+            db.close()
 
     async def _await_inflight_with_timeout(self, timeout_s: float) -> None:
         """
@@ -102,10 +123,16 @@ class ExtractorWorker:
                 return_when=asyncio.ALL_COMPLETED,
             )
         finally:
-            # 標記尚未完成者為 canceled
-            for task_id, task in snapshot:
-                if not task.done():
-                    self._mark_aborted_by_shutdown(task_id)
+            # 標記尚未完成者為 canceled（共用同一個 session）
+            db: Session = SessionLocal()
+            try:
+                for task_id, task in snapshot:
+                    if not task.done():
+                        # 先記在記憶體，執行緒寫回前就看得到；再寫 DB
+                        self._canceled_ids.add(task_id)
+                        self._mark_aborted_by_shutdown(db, task_id)
+            finally:
+                db.close()
 
     # ─────────────────────────────────────────────────────────
     # 公開 API：入列時就先建 DB row（/tasks 立即可見 queued）
@@ -116,69 +143,85 @@ class ExtractorWorker:
         並把 (task_id, force_rerun) 丟進 queue。
         若正在關閉中，仍會建 row 以保留記錄，但不會讓 worker 開跑（稍後 stop 會統一 canceled）。
         """
-        db: Session = SessionLocal()
-        try:
-            t = ExtractionTask(
-                file_hash=file_hash,
-                mode="sync",
-                status="queued",
-                created_at=datetime.now(timezone.utc),
-            )
-            db.add(t)
-            db.commit()
-            task_id = t.id
-        finally:
-            db.close()
+        # DB 寫入為同步 I/O，丟到 thread 避免卡住 event loop
+        [task_id] = await asyncio.to_thread(self._create_queued_tasks, [file_hash])
 
         # 若已進入關閉流程，讓 stop() 統一處理取消
         if not self._shutting_down:
             await self.queue.put((task_id, force_rerun))
         return task_id
 
+    async def enqueue_many(self, file_hashes: List[str], force_rerun: bool = False) -> List[int]:
+        """
+        批次版 enqueue：同一個 session 一次建立所有 ExtractionTask(status='queued') 並單次 commit，
+        再以 put_nowait 連續丟進 queue（只有 queue 滿時才退回 await put）。
+        回傳 task_id 清單（順序同 file_hashes）。
+        """
+        if not file_hashes:
+            return []
+
+        task_ids = await asyncio.to_thread(self._create_queued_tasks, file_hashes)
+
+        # 若已進入關閉流程，讓 stop() 統一處理取消
+        if not self._shutting_down:
+            for task_id in task_ids:
+                try:
+                    self.queue.put_nowait((task_id, force_rerun))
+                except asyncio.QueueFull:
+                    await self.queue.put((task_id, force_rerun))
+        return task_ids
+
     # ─────────────────────────────────────────────────────────
     # 內部工具：DB 標記
 
+    def _create_queued_tasks(self, file_hashes: List[str]) -> List[int]:
+        """同一個 session 建立多筆 ExtractionTask(status='queued')，單次 commit，回傳 task_id。"""
+        db: Session = SessionLocal()
+        try:
+            now = datetime.now(timezone.utc)
+            tasks = [
+                ExtractionTask(file_hash=h, mode="sync", status="queued", created_at=now)
+                for h in file_hashes
+            ]
+            db.add_all(tasks)
+            db.commit()
+            return [t.id for t in tasks]
+        finally:
+            db.close()
+
     def _mark_failed(self, db: Session, t: ExtractionTask, err: str) -> None:
         t.status = "failed"
         t.error = err
         t.completed_at = datetime.now(timezone.utc)
         db.commit()
 
-    def _mark_canceled_before_start(self, task_id: int) -> None:
+    def _mark_canceled_before_start(self, db: Session, task_id: int) -> None:
         """
         尚未開始的任務（仍在 queue），標記為 canceled。
         """
-        db: Session = SessionLocal()
-        try:
-            t: Optional[ExtractionTask] = db.get(ExtractionTask, task_id)
-            if not t:
-                return
-            if t.status not in ("queued",):
-                return
-            t.status = "canceled"
-            t.error = "canceled before start due to shutdown"
-            t.completed_at = datetime.now(timezone.utc)
-            db.commit()
-        finally:
-            db.close()
+        t: Optional[ExtractionTask] = db.get(ExtractionTask, task_id)
+        if not t:
+            return
+        if t.status not in ("queued",):
+            return
+        t.status = "canceled"
+        t.error = "canceled before start due to shutdown"
+        t.completed_at = datetime.now(timezone.utc)
+        db.commit()
 
-    def _mark_aborted_by_shutdown(self, task_id: int) -> None:
+    def _mark_aborted_by_shutdown(self, db: Session, task_id: int) -> None:
         """
         已經開始執行但未在 timeout 內完成的任務，標記為 canceled。
         """
-        db: Session = SessionLocal()
-        try:
-            t: Optional[ExtractionTask] = db.get(ExtractionTask, task_id)
-            if not t:
-                return
-            # 僅針對 running 态做中止標記；避免覆寫已完成/失敗/取消
-            if t.status == "running":
-                t.status = "canceled"
-                t.error = "aborted by shutdown (timed out waiting)"
-                t.completed_at = datetime.now(timezone.utc)
-                db.commit()
-        finally:
-            db.close()
+        t: Optional[ExtractionTask] = db.get(ExtractionTask, task_id)
+        if not t:
+            return
+        # 僅針對 running 态做中止標記；避免覆寫已完成/失敗/取消
+        if t.status == "running":
+            t.status = "canceled"
+            t.error = "aborted by shutdown (timed out waiting)"
+            t.completed_at = datetime.now(timezone.utc)
+            db.commit()
 
     # ─────────────────────────────────────────────────────────
     # 核心：由 task_id 執行一次擷取
@@ -186,7 +229,7 @@ class ExtractorWorker:
     def _run_one_by_id(self, task_id: int, force_rerun: bool) -> None:
         """
         根據 task_id 執行一次同步擷取（覆用 extract_with_openai）。
-        注意：此方法在 ThreadPoolExecutor 中執行。
+        注意：此方法在 self._pool（ThreadPoolExecutor）中執行。
         """
         db: Session = SessionLocal()
         t: Optional[ExtractionTask] = None
@@ -217,11 +260,10 @@ class ExtractorWorker:
                 model_name="gpt-5",
                 mode=t.mode or "sync",
                 service_tier=t.service_tier,  # 若之前有指定 tier，沿用；否則 None
+                should_stop=lambda: task_id in self._canceled_ids,  # stop() 逾時標記後，Batch API 輪詢即時跳出
             )
 
-            # 再次讀取最新狀態，避免與關閉流程的 canceled 衝突
-            db.refresh(t)
-            if t.status == "canceled":
+            if task_id in self._canceled_ids:
                 # 已被 stop() 標記中止，不覆寫狀態
                 return
 
@@ -245,13 +287,9 @@ class ExtractorWorker:
 
         except Exception as e:
             if t is not None:
-                # 再次讀取，避免覆寫 canceled
-                try:
-                    db.refresh(t)
-                    if t.status == "canceled":
-                        return
-                except Exception:
-                    pass
+                # 已被 stop() 標記中止，避免覆寫 canceled
+                if task_id in self._canceled_ids:
+                    return
                 self._mark_failed(db, t, f"{e}\n{traceback.format_exc()}")
             else:
                 # 連任務都取不到時，不再嘗試建新紀錄（task_id 既已存在）
@@ -273,9 +311,8 @@ class ExtractorWorker:
                 if self._shutting_down:
                     continue
 
-                # 正確做法：用 to_thread 產生 coroutine，再 create_task
-                coro = asyncio.to_thread(self._run_one_by_id, task_id, force_rerun)
-                atask = asyncio.create_task(coro)
+                # 丟到擷取專用執行緒池；回傳的 future 供 stop() 等待/逾時判斷
+                atask = asyncio.get_running_loop().run_in_executor(self._pool, self._run_one_by_id, task_id, force_rerun)
                 self._inflight[task_id] = atask
 
                 try:
@@ -289,4 +326,4 @@ class ExtractorWorker:
                 self.queue.task_done()
 
 
-extractor_worker = ExtractorWorker()
+extractor_worker = ExtractorWorker(max_concurrency=settings.EXTRACTOR_MAX_CONCURRENCY)
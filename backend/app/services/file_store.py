@@ -1,32 +1,43 @@
 from __future__ import annotations
 from typing import Optional
 from pathlib import Path
+import asyncio
 import hashlib
-import io
+import os
+import uuid
 from datetime import datetime, timezone
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from ..settings import settings
 from ..models import FileAsset
 
 STORE_DIR = settings.WORKSPACE_DIR / "store"
 
-class HashableBytesIO(io.BytesIO):
-    name: Optional[str] = None
-    @property
-    def hash(self) -> str:
-        h = hashlib.sha256()
-        h.update(self.getvalue())
-        return h.hexdigest()
+def new_content_hasher():
+    """
+    file_hash 的唯一來源（上傳與串流下載共用）：SHA-256。
+    hashlib 走 OpenSSL，x86-64 上會用 SHA-NI 硬體指令。
+    file_hash 同時是 FileAsset 主鍵、store/extractions 檔名與 URL 的一部分，換演算法會讓既有檔案無法去重。
+    """
+    return hashlib.sha256()
+
+def _already_stored(fa: Optional[FileAsset]) -> bool:
+    """重複內容：紀錄與實體檔都在，就不必再寫檔或寫 DB"""
+    return fa is not None and bool(fa.local_path) and os.path.exists(fa.local_path)
 
 async def persist_bytes_to_store(db: Session, data: bytes, filename: str, source_url: Optional[str]) -> str:
-    hb = HashableBytesIO(data)
-    hb.name = filename or "datasheet.pdf"
-    file_hash = hb.hash
+    # 直接對 bytes 算 hash（不經 BytesIO，避免多複製一份內容）
+    h = new_content_hasher()
+    h.update(data)
+    file_hash = h.hexdigest()
+    fa = db.get(FileAsset, file_hash)
+    if _already_stored(fa):
+        return file_hash
     pdf_path = STORE_DIR / f"{file_hash}.pdf"
     if not pdf_path.exists():
-        pdf_path.write_bytes(data)
+        # 大檔寫入丟到 thread，避免卡住 event loop
+        await asyncio.to_thread(pdf_path.write_bytes, data)
     # upsert
-    fa = db.get(FileAsset, file_hash)
     if not fa:
         fa = FileAsset(
             file_hash=file_hash,
@@ -36,6 +47,92 @@ async def persist_bytes_to_store(db: Session, data: bytes, filename: str, source
             local_path=str(pdf_path),
             created_at=datetime.now(timezone.utc),
         )
-        db.add(fa)
+        _add_asset(db, fa)
+    return file_hash
+
+def _add_asset(db: Session, fa: FileAsset) -> None:
+    """
+    新增 FileAsset。URL 合併只對同一 URL 去重：不同 URL 同時下載到相同內容時，另一邊可能先寫入同一主鍵；
+    這時 rollback 後確認紀錄已在即可（檔案是同一份 store/{file_hash}.pdf）。
+    """
+    db.add(fa)
+    try:
         db.commit()
+    except IntegrityError:
+        db.rollback()
+        if db.get(FileAsset, fa.file_hash) is None:
+            raise
+
+def temp_store_path() -> Path:
+    """store/ 底下的暫存檔路徑（與正式檔同一個 filesystem，完成後可直接 os.replace）"""
+    return STORE_DIR / f".tmp-{uuid.uuid4().hex}"
+
+def persist_file_to_store(
+    db: Session,
+    tmp_path: Path,
+    file_hash: str,
+    filename: str,
+    source_url: Optional[str],
+    size_bytes: int,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+) -> str:
+    """
+    串流下載用：內容已寫在 tmp_path、hash 已邊收邊算好。
+    這裡只負責把暫存檔搬到 store/{file_hash}.pdf（已存在就丟掉暫存檔）並 upsert FileAsset；
+    紀錄與檔案都已存在時直接回傳，只在同一 URL 的 HTTP 驗證器有變時更新。
+    """
+    pdf_path = STORE_DIR / f"{file_hash}.pdf"
+    try:
+        fa = db.get(FileAsset, file_hash)
+        if _already_stored(fa):
+            _refresh_validators(db, fa, source_url, etag, last_modified)
+            return file_hash
+        if not pdf_path.exists():
+            os.replace(tmp_path, pdf_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    # upsert
+    if not fa:
+        fa = FileAsset(
+            file_hash=file_hash,
+            filename=filename,
+            source_url=source_url,
+            size_bytes=size_bytes,
+            local_path=str(pdf_path),
+            created_at=datetime.now(timezone.utc),
+            etag=etag,
+            last_modified=last_modified,
+        )
+        _add_asset(db, fa)
     return file_hash
+
+def _refresh_validators(
+    db: Session,
+    fa: FileAsset,
+    source_url: Optional[str],
+    etag: Optional[str],
+    last_modified: Optional[str],
+) -> None:
+    """同一 URL 重抓到相同內容：伺服器給了新的 ETag/Last-Modified 才寫回，下次才能拿到 304"""
+    if fa.source_url != source_url or not (etag or last_modified):
+        return
+    if (fa.etag, fa.last_modified) == (etag, last_modified):
+        return
+    fa.etag = etag
+    fa.last_modified = last_modified
+    db.commit()
+
+def find_revalidatable_asset(db: Session, source_url: str) -> Optional[FileAsset]:
+    """
+    同一 source_url 最近一次下載、且帶有 HTTP 驗證器的 FileAsset（實體檔仍在）；
+    供 conditional GET 使用，找不到回 None。
+    """
+    fa = (
+        db.query(FileAsset)
+        .filter(FileAsset.source_url == source_url)
+        .filter((FileAsset.etag.isnot(None)) | (FileAsset.last_modified.isnot(None)))
+        .order_by(FileAsset.created_at.desc())
+        .first()
+    )
+    return fa if _already_stored(fa) else None
@@ -1,17 +1,33 @@
 # backend/app/services/openai_service.py
 from __future__ import annotations
 
-from typing import List, Dict, Any, Optional, Literal, Tuple
+from typing import Callable, Iterable, List, Dict, Any, Optional, Literal, Tuple
 from pathlib import Path
-import traceback
+from itertools import islice
+import asyncio
+import logging
 import datetime
+import hashlib
 import json
+import os
 import re
+import threading
+import time
+import uuid
 
+import httpx
 import openai
-from sqlalchemy.orm import Session
+import orjson
+from openai.types.responses import Response
+from jsonschema.validators import validator_for
+from pydantic import BaseModel
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
 from ..settings import settings
+from .rate_limiter import RateLimiter, retry_after_seconds
 from ..models import (
     FileAsset,
     ModelItem,
@@ -19,6 +35,8 @@ from ..models import (
     FileModelAppearance,
 )
 
+logger = logging.getLogger(__name__)
+
 # ────────────────────────────── 檔案/常數 ──────────────────────────────
 
 INSTR_DIR = Path(__file__).resolve().parents[3] / "resources" / "openai"
@@ -34,8 +52,9 @@ def _safe_read_text(p: Path, default: str = "") -> str:
         return default
 
 def _safe_read_json(p: Path, default: dict | list | None = None):
+    # 直接讀 bytes 交給 orjson 解析（UTF-8 解碼在 C/Rust 端完成）
     try:
-        return json.loads(p.read_text(encoding="utf-8"))
+        return orjson.loads(p.read_bytes())
     except Exception:
         return default
 
@@ -47,6 +66,9 @@ SCHEMA_EXTRACT    = _safe_read_json(SCHEMA_EXTRACT_PATH, default=None)
 EXTRACT_DIR = settings.WORKSPACE_DIR / "extractions"
 EXTRACT_DIR.mkdir(parents=True, exist_ok=True)
 
+# 回應快取（settings.OPENAI_RESPONSE_CACHE）：同樣的檔案 + 指令 + schema + 模型（+ 型號批次）直接重用上次結果
+RESPONSE_CACHE_DIR = EXTRACT_DIR / "_cache"
+
 # --- pricing: 每 1M tokens 的 USD 單價 ---
 PRICING_PER_1M = {
     "gpt-5":   {"input": 1.25, "cached_input": 0.125, "output": 10.00},
@@ -54,8 +76,14 @@ PRICING_PER_1M = {
     "gpt-4o":  {"input": 2.50, "cached_input": 1.25,  "output": 10.00},
 }
 
+# 每 token 單價（input, cached_input, output），載入時先除好，_calc_cost 只剩乘加
+_RATES: Dict[str, Tuple[float, float, float]] = {
+    m: (r["input"] / 1_000_000.0, r["cached_input"] / 1_000_000.0, r["output"] / 1_000_000.0)
+    for m, r in PRICING_PER_1M.items()
+}
+
 # OpenAI 可能回傳版本化 model 名稱，例如 "gpt-5-2025-10-03"；這裡只針對日期版本做定價歸一化，避免誤把 "gpt-4o-mini" 映射成 "gpt-4o"。
-_VERSIONED_MODEL_RE = re.compile(r"^(gpt-5|gpt-4\\.1|gpt-4o)-\\d{4}-\\d{2}-\\d{2}(?:$|-)", re.IGNORECASE)
+_VERSIONED_MODEL_RE = re.compile(r"^(gpt-5|gpt-4\.1|gpt-4o)-\d{4}-\d{2}-\d{2}(?:$|-)", re.IGNORECASE)
 
 def _pricing_key_for_model(model: Optional[str]) -> Optional[str]:
     if not model:
@@ -68,6 +96,59 @@ def _pricing_key_for_model(model: Optional[str]) -> Optional[str]:
         return key if key in PRICING_PER_1M else None
     return None
 
+# ────────────────────────────── 限速 / client ──────────────────────────────
+
+# 全程序共用的 RPM/TPM 額度（所有擷取執行緒、同步與非同步 client 一起算）
+_RATE_LIMITER = RateLimiter(settings.OPENAI_RPM, settings.OPENAI_TPM)
+
+def _estimate_tokens(*texts: str) -> int:
+    """
+    粗估請求 token 數供限速用：UTF-8 bytes / 3（英文約 4 bytes、中文約 3 bytes 一個 token，取保守值）。
+    PDF 檔案本身的 token 事前無法得知，超出的部分由 429 時的整桶暫停吸收。
+    """
+    return sum(len(t.encode("utf-8")) for t in texts if t) // 3
+
+def _pause_on_429(response: httpx.Response) -> None:
+    # SDK 收到 429 會自行依 Retry-After 重試；這裡同時暫停整桶，讓其他併發請求一起退讓
+    if response.status_code == 429:
+        _RATE_LIMITER.pause(retry_after_seconds(response.headers))
+
+async def _pause_on_429_async(response: httpx.Response) -> None:
+    _pause_on_429(response)
+
+# 同步 client 跨工作共用（httpx.Client 執行緒安全）：連線池保持 keep-alive，不必每個檔案重做 TCP/TLS 握手
+_CLIENTS: Dict[str, openai.OpenAI] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+def _client_for(api_key: str) -> openai.OpenAI:
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(api_key)
+        if client is None:
+            client = _CLIENTS[api_key] = openai.OpenAI(
+                api_key=api_key,
+                http_client=openai.DefaultHttpxClient(event_hooks={"response": [_pause_on_429]}),
+            )
+        return client
+
+def close_clients() -> None:
+    """關閉共用的 OpenAI client（app 關閉時呼叫）。"""
+    with _CLIENTS_LOCK:
+        clients = list(_CLIENTS.values())
+        _CLIENTS.clear()
+    for client in clients:
+        try:
+            client.close()
+        except Exception:
+            logger.warning("failed to close OpenAI client", exc_info=True)
+
+# AsyncOpenAI 綁定建立時的 event loop；每次 asyncio.run 各自建立、用完關閉
+
+def _new_async_client() -> openai.AsyncOpenAI:
+    return openai.AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        http_client=openai.DefaultAsyncHttpxClient(event_hooks={"response": [_pause_on_429_async]}),
+    )
+
 # ────────────────────────────── 共用小工具 ──────────────────────────────
 
 def _pick(v, *keys, default=None):
@@ -94,25 +175,135 @@ def _to_int(x) -> int:
 def _extract_usage(resp) -> dict:
     """
     統一從 Responses 回傳取用量。
-    - input_tokens: usage.input_tokens / usage.prompt_tokens
+    - input_tokens: usage.input_tokens / usage.prompt_tokens（不含快取命中的部分）
     - output_tokens: usage.output_tokens / usage.completion_tokens
     - cached_input: 優先 sum(cache_read_input_tokens, cache_write_input_tokens)；
-                    若兩者皆無，再退回 cached_input_tokens / cached_tokens。
+                    若兩者皆無，再退回 cached_input_tokens / cached_tokens；
+                    再退回 input_tokens_details.cached_tokens（OpenAI 的 prompt caching，
+                    此值已含在 input_tokens 內，故從 input 扣掉，避免重複計價）。
     """
-    u = getattr(resp, "usage", None) or {}
+    # SDK 的 usage 是 pydantic model：model_dump() 一次轉成 dict（含 extra 欄位），之後都是 dict 查找
+    u = getattr(resp, "usage", None)
+    if u is None:
+        d: Dict[str, Any] = {}
+    elif isinstance(u, dict):
+        d = u
+    elif hasattr(u, "model_dump"):
+        d = u.model_dump()
+    else:
+        d = vars(u)
 
     # 基本
-    input_tokens  = _to_int(_pick(u, "input_tokens", "prompt_tokens", default=0))
-    output_tokens = _to_int(_pick(u, "output_tokens", "completion_tokens", default=0))
+    input_tokens  = _to_int(d.get("input_tokens") or d.get("prompt_tokens") or 0)
+    output_tokens = _to_int(d.get("output_tokens") or d.get("completion_tokens") or 0)
 
     # 盡量避免低估：若同時存在 read/write 就加總；否則回退 aggregate 欄位
-    read_cached   = _to_int(_pick(u, "cache_read_input_tokens", "cached_read_input_tokens", default=0))
-    write_cached  = _to_int(_pick(u, "cache_write_input_tokens", "cached_write_input_tokens", default=0))
-    aggregate     = _to_int(_pick(u, "cached_input_tokens", "cached_tokens", default=0))
+    read_cached   = _to_int(d.get("cache_read_input_tokens") or d.get("cached_read_input_tokens") or 0)
+    write_cached  = _to_int(d.get("cache_write_input_tokens") or d.get("cached_write_input_tokens") or 0)
+    aggregate     = _to_int(d.get("cached_input_tokens") or d.get("cached_tokens") or 0)
 
     cached_input = (read_cached + write_cached) if (read_cached + write_cached) > 0 else aggregate
+    if not cached_input:
+        details = d.get("input_tokens_details") or d.get("prompt_tokens_details") or {}
+        details_cached = _to_int(details.get("cached_tokens") or 0) if isinstance(details, dict) else 0
+        if details_cached:
+            cached_input = details_cached
+            input_tokens = max(0, input_tokens - details_cached)
     return {"input": input_tokens, "cached_input": cached_input, "output": output_tokens}
 
+# 檔案後固定的錨點文字：與檔案放同一則訊息，讓「instructions + 檔案 + 錨點」在同一檔案的多次呼叫間
+# 逐 byte 相同，吃到 OpenAI 的自動 prompt caching；每次不同的內容一律放在後面的訊息
+_FILE_ANCHOR_TEXT = "以上為本次要處理的 datasheet 檔案。"
+
+def _file_message(file: Optional[openai.types.FileObject]) -> List[dict]:
+    """靜態前綴訊息（檔案 + 錨點）；沒有檔案時不送。"""
+    if not file:
+        return []
+    return [{
+        "role": "user",
+        "content": [
+            {"type": "input_file", "file_id": file.id},
+            {"type": "input_text", "text": _FILE_ANCHOR_TEXT},
+        ],
+    }]
+
+def _build_common_kwargs(
+    *,
+    model_name: str,
+    instructions: str,
+    schema: Optional[dict],
+    file: Optional[openai.types.FileObject],
+    text: str,
+) -> dict:
+    """
+    型號清單與擷取請求共用的參數組裝：鍵的順序、檔案訊息位置都固定，
+    同一檔案的每次呼叫序列化後的前綴（instructions + 檔案 + 錨點）逐位元組相同，才吃得到 prompt caching。
+    （instructions 本身未達 1024 tokens 也無妨：快取門檻算的是整段前綴，PDF 內容已遠超過。）
+    """
+    kwargs = dict(
+        model=model_name,
+        instructions=instructions,
+        input=[
+            *_file_message(file),
+            {"role": "user", "content": [{"type": "input_text", "text": text}]},
+        ],
+        text={"format": schema},
+    )
+    if file:
+        kwargs["prompt_cache_key"] = file.id  # 同一檔案的請求導向同一快取
+    return kwargs
+
+_GET_MODELS_PROMPT = "請根據指令回傳數據。沒看到檔案就說沒看到檔案，沒看到指令就說沒看到指令。"
+
+# 擷取請求的 payload 只有 models 會變：固定的開頭預先組好，每次只序列化型號清單
+# （與 json.dumps({"request_type": ..., "models": [...]}) 的輸出逐字相同）
+_EXTRACT_PAYLOAD_HEAD = '{"request_type": "Datasheet_Parsing_Request", "models": '
+
+def _sha256(*parts: str) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+def _schema_text(schema) -> str:
+    return orjson.dumps(schema, option=orjson.OPT_SORT_KEYS).decode("utf-8")
+
+# 各階段「固定輸入」的指紋：指令或 schema 一改，舊快取自然失效
+_GET_MODELS_INPUT_DIGEST = _sha256(INST_GET_MODELS, _schema_text(SCHEMA_GET_MODELS), _FILE_ANCHOR_TEXT, _GET_MODELS_PROMPT)
+_EXTRACT_INPUT_DIGEST = _sha256(INST_EXTRACT, _schema_text(SCHEMA_EXTRACT), _FILE_ANCHOR_TEXT)
+
+def _response_cache_get(stage: str, key: str) -> Optional[dict]:
+    if not settings.OPENAI_RESPONSE_CACHE:
+        return None
+    try:
+        return orjson.loads((RESPONSE_CACHE_DIR / stage / f"{key}.json").read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+
+def _response_cache_put(stage: str, key: str, value: dict) -> None:
+    if not settings.OPENAI_RESPONSE_CACHE:
+        return
+    try:
+        d = RESPONSE_CACHE_DIR / stage
+        d.mkdir(parents=True, exist_ok=True)
+        tmp = d / f".tmp-{uuid.uuid4().hex}"
+        tmp.write_bytes(orjson.dumps(value))
+        os.replace(tmp, d / f"{key}.json")
+    except OSError:
+        logger.warning("failed to write response cache %s/%s", stage, key, exc_info=True)
+
+def _cache_hit_rate(usage: dict) -> float:
+    """輸入 tokens 中命中 prompt cache 的比例（0~1）。"""
+    total_in = usage["input"] + usage["cached_input"]
+    return usage["cached_input"] / total_in if total_in else 0.0
+
+def _log_cache_usage(stage: str, usage: dict) -> None:
+    logger.info(
+        "openai %s: cached %d / %d input tokens (%.0f%%)",
+        stage, usage["cached_input"], usage["input"] + usage["cached_input"], 100.0 * _cache_hit_rate(usage),
+    )
+
 def _acc(a: dict, b: dict) -> dict:
     return {
         "input": a.get("input", 0) + b.get("input", 0),
@@ -134,9 +325,10 @@ def _calc_cost(
       - service_tier in {'priority','scale'} → 2.0x
     """
     pricing_key = _pricing_key_for_model(model)
-    rate = PRICING_PER_1M.get(pricing_key) if pricing_key else None
-    if not rate:
+    rate = _RATES.get(pricing_key) if pricing_key else None
+    if rate is None:
         return 0.0
+    r_in, r_cached, r_out = rate
 
     mult = 1.0
     if service_tier == "flex" or mode == "batch":
@@ -144,11 +336,7 @@ def _calc_cost(
     elif service_tier in ("priority", "scale"):
         mult = 2.0
 
-    cost = (
-        usage["input"] * (rate["input"] / 1_000_000.0) +
-        usage["cached_input"] * (rate["cached_input"] / 1_000_000.0) +
-        usage["output"] * (rate["output"] / 1_000_000.0)
-    )
+    cost = usage["input"] * r_in + usage["cached_input"] * r_cached + usage["output"] * r_out
     return round(cost * mult, 6)
 
 def _resolve_model_and_tier(
@@ -161,17 +349,87 @@ def _resolve_model_and_tier(
     tier  = _pick(resp, "service_tier", default=fallback_tier)
     return model, tier  # type: ignore[return-value]
 
+# ────────────────────────────── 檔案上傳 ──────────────────────────────
+
+# 上傳檔案由 OpenAI 端自動到期（上限 30 天），不需要另外清理孤兒檔案
+_OPENAI_FILE_TTL_SECONDS = 30 * 24 * 3600
+# 剩餘效期不足時重新上傳，避免擷取途中檔案到期
+_OPENAI_FILE_MIN_REMAINING = 3600
+
+def _ensure_openai_file(client: openai.OpenAI, db: Session, fa: FileAsset) -> openai.types.FileObject:
+    """
+    同一 file_hash 只上傳一次：FileAsset.openai_file_id 仍有效就沿用，否則重新上傳並記下 id。
+    """
+    if fa.openai_file_id:
+        try:
+            file = client.files.retrieve(fa.openai_file_id)
+            expires_at = file.expires_at
+            if file.status != "error" and (
+                expires_at is None
+                or expires_at - datetime.datetime.now(datetime.timezone.utc).timestamp() > _OPENAI_FILE_MIN_REMAINING
+            ):
+                return file
+        except openai.NotFoundError:
+            pass
+
+    # 直接交檔案 handle，由 httpx 分塊串流上傳，不必整份 PDF 讀進記憶體
+    with open(fa.local_path, "rb") as fh:
+        file = client.files.create(
+            file=(fa.filename or "datasheet.pdf", fh),
+            purpose="user_data",
+            expires_after={"anchor": "created_at", "seconds": _OPENAI_FILE_TTL_SECONDS},
+        )
+    fa.openai_file_id = file.id
+    db.commit()
+    return file
+
 # ────────────────────────────── JSON Schema 調用 ──────────────────────────────
 
+# 結構化輸出的外層：pydantic 驗證型別，格式不符時拿到明確的 ValidationError。
+# 只描述 models 這一層；各型號物件仍以 dict 交給 _project_item_from_schema / 回應快取 / 輸出 JSON。
+# （擷取 schema 允許 "models": null，視同空陣列）
+class _GetModelsOut(BaseModel):
+    models: Optional[List[str]] = None
+
+class _ExtractOut(BaseModel):
+    models: Optional[List[Dict[str, Any]]] = None
+
+def _compile_validator(fmt: Optional[dict]):
+    """response_format 內的 JSON Schema 在載入時建好 validator，之後每次回應直接重用。"""
+    schema = (fmt or {}).get("schema")
+    if not schema:
+        return None
+    return validator_for(schema)(schema)
+
+_VALIDATOR_GET_MODELS = _compile_validator(SCHEMA_GET_MODELS)
+_VALIDATOR_EXTRACT    = _compile_validator(SCHEMA_EXTRACT)
+
+def _parse_structured(stage: str, text: str, validator, envelope: type[BaseModel]) -> BaseModel:
+    """
+    解析結構化輸出：orjson 解析一次 → 依完整 JSON Schema 檢查（只記錄違規，不丟棄資料）→ pydantic 外層。
+    JSON 壞掉或外層型別不符時丟 ValueError（orjson.JSONDecodeError / ValidationError 皆是）。
+    """
+    data = orjson.loads(text)
+    if validator is not None:
+        errors = list(islice(validator.iter_errors(data), 5))
+        if errors:
+            logger.warning(
+                "%s: response violates schema: %s",
+                stage, "; ".join(f"{'/'.join(map(str, e.absolute_path)) or '<root>'}: {e.message}" for e in errors),
+            )
+    return envelope.model_validate(data)
+
 def _get_model_numbers(
     client: openai.OpenAI,
     *,
     model_name: str,
     service_tier: Optional[Literal["auto", "default", "flex", "priority", "scale"]] = None,
     file: Optional[openai.types.FileObject] = None,
+    file_hash: Optional[str] = None,
 ) -> dict:
     """
     取出型號清單（以 json_schema 結構化輸出）。
+    有 file_hash 且開啟 OPENAI_RESPONSE_CACHE 時，先查回應快取（命中則 usage 為 0）。
     回傳：
     {
       "models": List[str],
@@ -180,47 +438,52 @@ def _get_model_numbers(
       "service_tier": Optional[str],
     }
     """
+    cache_key = _sha256(file_hash, _GET_MODELS_INPUT_DIGEST, model_name) if file_hash else None
+    if cache_key and (hit := _response_cache_get("get_models", cache_key)) is not None:
+        return {**hit, "usage": {"input": 0, "cached_input": 0, "output": 0}}
+
     try:
-        kwargs = dict(
-            model=model_name,
+        kwargs = _build_common_kwargs(
+            model_name=model_name,
             instructions=INST_GET_MODELS,
-            input=[{
-                "role": "user",
-                "content": [
-                    *([{"type": "input_file", "file_id": file.id}] if file else []),
-                    {"type": "input_text",
-                     "text": "請根據指令回傳數據。沒看到檔案就說沒看到檔案，沒看到指令就說沒看到指令。"},
-                ],
-            }],
-            text={"format": SCHEMA_GET_MODELS},
-            timeout=900,
+            schema=SCHEMA_GET_MODELS,
+            file=file,
+            text=_GET_MODELS_PROMPT,
         )
+        kwargs["timeout"] = 900
         if service_tier:
             kwargs["service_tier"] = service_tier
 
+        _RATE_LIMITER.acquire_sync(_estimate_tokens(INST_GET_MODELS, _GET_MODELS_PROMPT))
         resp = client.responses.create(**kwargs)
 
         usage = _extract_usage(resp)
+        _log_cache_usage("get_models", usage)
         actual_model, actual_tier = _resolve_model_and_tier(resp, model_name, service_tier)
 
         text = (getattr(resp, "output_text", "") or "").strip()
-        models = []
+        models: List[str] = []
         if text:
             try:
-                data = json.loads(text)
-                models = data.get("models", []) or []
-            except Exception:
-                models = []
+                models = _parse_structured("get_models", text, _VALIDATOR_GET_MODELS, _GetModelsOut).models or []
+            except ValueError:
+                logger.warning("get_models: response does not match schema", exc_info=True)
 
-        return {
+        result = {
             "models": models,
             "usage": usage,
             "model": actual_model,
             "service_tier": actual_tier,
         }
+        if cache_key and models:
+            _response_cache_put("get_models", cache_key, result)
+        return result
 
     except Exception:
-        traceback.print_exc()
+        logger.exception(
+            "get_models failed (file_hash=%s, model=%s)", file_hash, model_name,
+            extra={"file_hash": file_hash, "model_name": model_name},
+        )
         return {
             "models": [],
             "usage": {"input": 0, "cached_input": 0, "output": 0},
@@ -228,76 +491,377 @@ def _get_model_numbers(
             "service_tier": service_tier,
         }
 
-def _run_extraction(
-    client: openai.OpenAI,
+def _extract_payload_text(models: List[str]) -> str:
+    return _EXTRACT_PAYLOAD_HEAD + json.dumps(models, ensure_ascii=False) + "}"
+
+def _extract_request_body(
+    models: List[str],
+    *,
+    model_name: str,
+    file: Optional[openai.types.FileObject] = None,
+) -> dict:
+    """一批型號的擷取請求本體（即時呼叫與 Batch API 共用；不含 timeout / service_tier）。"""
+    return _build_common_kwargs(
+        model_name=model_name,
+        instructions=INST_EXTRACT,
+        schema=SCHEMA_EXTRACT,
+        file=file,
+        text=_extract_payload_text(models),
+    )
+
+def _extract_cache_key(models: List[str], model_name: str, file_hash: Optional[str]) -> Optional[str]:
+    if not file_hash:
+        return None
+    return _sha256(file_hash, _EXTRACT_INPUT_DIGEST, model_name, "\n".join(sorted(models)))
+
+def _parse_extraction_response(
+    resp,
+    *,
+    models: List[str],
+    model_name: str,
+    service_tier: Optional[Literal["auto", "default", "flex", "priority", "scale"]] = None,
+    cache_key: Optional[str] = None,
+) -> dict:
+    """解析一次擷取回應（格式見 _run_extraction_async）；完整結果寫入回應快取。"""
+    usage = _extract_usage(resp)
+    _log_cache_usage("extract", usage)
+    actual_model, actual_tier = _resolve_model_and_tier(resp, model_name, service_tier)
+
+    incomplete = _pick(resp, "incomplete_details")
+    truncated = (
+        _pick(resp, "status") == "incomplete"
+        and _pick(incomplete, "reason") == "max_output_tokens"
+    )
+
+    text = (getattr(resp, "output_text", "") or "").strip()
+    items: List[Dict[str, Any]] = []
+    if text and not truncated:
+        try:
+            items = _parse_structured("extract", text, _VALIDATOR_EXTRACT, _ExtractOut).models or []
+        except ValueError:
+            logger.warning("extract: response does not match schema (%d models)", len(models), exc_info=True)
+            truncated = True
+
+    result = {
+        "items": items,
+        "usage": usage,
+        "model": actual_model,
+        "service_tier": actual_tier,
+        "truncated": truncated,
+    }
+    if cache_key and items and not truncated:
+        _response_cache_put("extract", cache_key, result)
+    return result
+
+async def _run_extraction_async(
+    client: openai.AsyncOpenAI,
     *,
     models: List[str],
     model_name: str,
     service_tier: Optional[Literal["auto", "default", "flex", "priority", "scale"]] = None,
     file: Optional[openai.types.FileObject] = None,
+    file_hash: Optional[str] = None,
 ) -> dict:
     """
     對一批 models 做欄位擷取，Responses + json_schema。
+    有 file_hash 且開啟 OPENAI_RESPONSE_CACHE 時，先查回應快取（鍵含排序後的型號批次）。
     回傳：
     {
       "items": List[dict],   # schema 的 key 為 "models"
       "usage": {"input": int, "cached_input": int, "output": int},
       "model": str,
       "service_tier": Optional[str],
+      "truncated": bool,     # 輸出被截斷（max_output_tokens）或 JSON 解析失敗 → 呼叫端可拆半重跑
     }
     """
-    try:
-        payload = {
-            "request_type": "Datasheet_Parsing_Request",
-            "models": list(models),
-        }
+    cache_key = _extract_cache_key(models, model_name, file_hash)
+    if cache_key and (hit := _response_cache_get("extract", cache_key)) is not None:
+        return {**hit, "usage": {"input": 0, "cached_input": 0, "output": 0}, "truncated": False}
 
-        kwargs = dict(
-            model=model_name,
-            instructions=INST_EXTRACT,
-            input=[{
-                "role": "user",
-                "content": [
-                    *([{"type": "input_file", "file_id": file.id}] if file else []),
-                    {"type": "input_text", "text": json.dumps(payload, ensure_ascii=False)},
-                ],
-            }],
-            text={"format": SCHEMA_EXTRACT},
-            timeout=900,
-        )
+    try:
+        kwargs = _extract_request_body(models, model_name=model_name, file=file)
+        kwargs["timeout"] = 900
         if service_tier:
             kwargs["service_tier"] = service_tier
 
-        resp = client.responses.create(**kwargs)
-
-        usage = _extract_usage(resp)
-        actual_model, actual_tier = _resolve_model_and_tier(resp, model_name, service_tier)
-
-        text = (getattr(resp, "output_text", "") or "").strip()
-        items: List[Dict[str, Any]] = []
-        if text:
-            try:
-                data = json.loads(text)
-                items = data.get("models", []) or []
-            except Exception:
-                items = []
-
-        return {
-            "items": items,
-            "usage": usage,
-            "model": actual_model,
-            "service_tier": actual_tier,
-        }
+        await _RATE_LIMITER.acquire(_estimate_tokens(INST_EXTRACT, _extract_payload_text(models)))
+        resp = await client.responses.create(**kwargs)
+        return _parse_extraction_response(
+            resp, models=models, model_name=model_name, service_tier=service_tier, cache_key=cache_key,
+        )
 
     except Exception:
-        traceback.print_exc()
+        logger.exception(
+            "extraction failed (file_hash=%s, model=%s, %d models)", file_hash, model_name, len(models),
+            extra={"file_hash": file_hash, "model_name": model_name},
+        )
         return {
             "items": [],
             "usage": {"input": 0, "cached_input": 0, "output": 0},
             "model": model_name,
             "service_tier": service_tier,
+            "truncated": False,
         }
 
+def _dedupe_models(models: Iterable[Any], file_hash: str) -> List[str]:
+    """
+    型號清單去重（保留首次出現順序）、去掉空值，並限制單檔上限。
+    模型偶爾會重複列出同一型號（別名、不同表格），重複的型號會被分進批次重複擷取。
+    """
+    seen = set()
+    out: List[str] = []
+    for m in models:
+        if not isinstance(m, str):
+            continue
+        m = m.strip()
+        if m and m not in seen:
+            seen.add(m)
+            out.append(m)
+    limit = settings.MAX_MODELS_PER_FILE
+    if limit > 0 and len(out) > limit:
+        logger.warning("get_models: %s returned %d models, keeping the first %d", file_hash, len(out), limit)
+        out = out[:limit]
+    return out
+
+def _chunks(seq: List[str], n: int):
+    """依序切出長度 n 的批次（lazy，用到才切）。"""
+    it = iter(seq)
+    return iter(lambda: list(islice(it, n)), [])
+
+async def _extract_batches(
+    batches: Iterable[List[str]],
+    *,
+    model_name: str,
+    service_tier: Optional[Literal["auto", "default", "flex", "priority", "scale"]] = None,
+    file: Optional[openai.types.FileObject] = None,
+    file_hash: Optional[str] = None,
+) -> List[dict]:
+    """
+    各批次擷取彼此獨立、且都在等 OpenAI 回應（I/O-bound）：
+    批次（通常是 _chunks 的 lazy 產生器）由 producer 邊取邊放進有界佇列，N 個 worker（N = settings.OPENAI_MAX_CONCURRENCY）取出後以 AsyncOpenAI 送出；
+    第一批不必等全部切完就能開始，實際同時進行的呼叫數由 semaphore 限制為 N。
+    某批輸出被截斷時拆成兩半再跑（遞迴，不回佇列，避免 worker 互等佇列空位），直到單一型號為止。
+    回傳每次呼叫的結果（含被截斷那次，用於計入 usage），依批次順序攤平。
+    """
+    client = _new_async_client()
+    n_workers = max(1, settings.OPENAI_MAX_CONCURRENCY)
+    sem = asyncio.Semaphore(n_workers)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=n_workers * 2)
+    per_batch: Dict[int, List[dict]] = {}
+
+    async def run(batch: List[str]) -> List[dict]:
+        # 只在實際呼叫時佔用 semaphore；拆半後的子批次要能再取得名額
+        async with sem:
+            ex = await _run_extraction_async(
+                client,
+                models=batch,
+                model_name=model_name,
+                service_tier=service_tier,
+                file=file,
+                file_hash=file_hash,
+            )
+        if not ex["truncated"] or len(batch) < 2:
+            return [ex]
+        mid = len(batch) // 2
+        left, right = await asyncio.gather(run(batch[:mid]), run(batch[mid:]))
+        return [ex, *left, *right]
+
+    async def produce() -> None:
+        for item in enumerate(batches):
+            await queue.put(item)
+        for _ in range(n_workers):
+            await queue.put(None)
+
+    async def work() -> None:
+        while (item := await queue.get()) is not None:
+            idx, batch = item
+            per_batch[idx] = await run(batch)
+            logger.debug("extract: batch %d done (%d models, file_hash=%s)", idx, len(batch), file_hash)
+
+    try:
+        await asyncio.gather(produce(), *(work() for _ in range(n_workers)))
+        return [ex for idx in sorted(per_batch) for ex in per_batch[idx]]
+    finally:
+        await client.close()
+
+# ────────────────────────────── Batch API（mode='batch'） ──────────────────────────────
+
+_BATCH_POLL_SECONDS = 30
+_BATCH_CANCEL_GRACE_SECONDS = 600  # 取消後等 batch 進入 cancelled 的上限（OpenAI 取消最久約 10 分鐘）
+_BATCH_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+def _sleep_unless(should_stop: Optional[Callable[[], bool]], seconds: float) -> bool:
+    """分段 sleep，期間 should_stop() 為真就提早回傳 True（worker 關閉時不必等滿輪詢間隔）。"""
+    end = time.monotonic() + seconds
+    while (left := end - time.monotonic()) > 0:
+        if should_stop is not None and should_stop():
+            return True
+        time.sleep(min(1.0, left))
+    return should_stop is not None and should_stop()
+
+def _cancel_batch(client: openai.OpenAI, batch_id: str) -> None:
+    try:
+        client.batches.cancel(batch_id)
+    except openai.OpenAIError:
+        logger.warning("failed to cancel batch %s", batch_id, exc_info=True)
+
+def _delete_openai_files(client: openai.OpenAI, *file_ids: Optional[str]) -> None:
+    for fid in file_ids:
+        if fid:
+            try:
+                client.files.delete(fid)
+            except openai.OpenAIError:
+                pass
+
+def _extract_batch_jsonl(
+    requests: Dict[str, List[str]],
+    *,
+    model_name: str,
+    file: Optional[openai.types.FileObject] = None,
+) -> bytes:
+    """
+    Batch API 輸入檔：每個 custom_id 一行 /v1/responses 擷取請求。
+    各行只有 custom_id 與型號 payload 不同：請求本體（含數十 KB 的 instructions / schema）以佔位字串序列化一次、
+    切成三段，每行只序列化變動的部分（輸出與逐行 orjson.dumps 逐位元組相同）。
+    """
+    cid_mark, text_mark = f"cid-{uuid.uuid4().hex}", f"text-{uuid.uuid4().hex}"
+    tmpl = orjson.dumps({
+        "custom_id": cid_mark,
+        "method": "POST",
+        "url": "/v1/responses",
+        "body": _build_common_kwargs(
+            model_name=model_name,
+            instructions=INST_EXTRACT,
+            schema=SCHEMA_EXTRACT,
+            file=file,
+            text=text_mark,
+        ),
+    })
+    head, rest = tmpl.split(orjson.dumps(cid_mark))
+    mid, tail = rest.split(orjson.dumps(text_mark))
+    tail += b"\n"
+    return b"".join(
+        head + orjson.dumps(cid) + mid + orjson.dumps(_extract_payload_text(models)) + tail
+        for cid, models in requests.items()
+    )
+
+def _submit_batch_jsonl(client: openai.OpenAI, data: bytes) -> openai.types.Batch:
+    """上傳 JSONL（見 _extract_batch_jsonl）後建立 batch；建立失敗時刪掉已上傳的輸入檔。"""
+    input_file = client.files.create(file=("extract_batch.jsonl", data), purpose="batch")
+    try:
+        return client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/responses",
+            completion_window="24h",
+        )
+    except openai.OpenAIError:
+        _delete_openai_files(client, input_file.id)
+        raise
+
+def _await_batch(
+    client: openai.OpenAI,
+    batch: openai.types.Batch,
+    *,
+    timeout: float,
+    poll: float = _BATCH_POLL_SECONDS,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> Dict[str, Response]:
+    """
+    輪詢到 batch 結束，把輸出 JSONL 解析成 {custom_id: Response}（失敗 / 未完成的請求不在結果內）。
+    - 超過 timeout 秒仍未結束：取消 batch，繼續輪詢到 cancelled，沿用已完成的部分輸出（已完成的請求照樣計費，不重跑）
+    - should_stop() 為真（任務被 worker 中止）：取消 batch 並丟 RuntimeError，不等取消完成
+    batch 的輸入/輸出/錯誤檔在任何離開路徑都會刪除（purpose=batch 預設保留 30 天）。
+    """
+    batch_id = batch.id
+    try:
+        deadline = time.monotonic() + timeout
+        cancel_deadline: Optional[float] = None
+        while batch.status not in _BATCH_TERMINAL_STATUSES:
+            now = time.monotonic()
+            if cancel_deadline is None and now >= deadline:
+                logger.warning("batch %s still %s after %.0fs; cancelling and keeping completed requests", batch_id, batch.status, timeout)
+                _cancel_batch(client, batch_id)
+                cancel_deadline = now + _BATCH_CANCEL_GRACE_SECONDS
+            elif cancel_deadline is not None and now >= cancel_deadline:
+                logger.warning("batch %s still %s %.0fs after cancel; giving up on it", batch_id, batch.status, _BATCH_CANCEL_GRACE_SECONDS)
+                return {}
+            if _sleep_unless(should_stop, poll):
+                _cancel_batch(client, batch_id)
+                raise RuntimeError(f"extraction canceled while waiting for batch {batch_id}")
+            batch = client.batches.retrieve(batch_id)
+
+        if batch.status != "completed":
+            logger.warning("batch %s ended with status %s", batch_id, batch.status)
+
+        out: Dict[str, Response] = {}
+        if batch.output_file_id:
+            for line in client.files.content(batch.output_file_id).read().splitlines():
+                if not line.strip():
+                    continue
+                rec = orjson.loads(line)
+                r = rec.get("response") or {}
+                if r.get("status_code") == 200 and r.get("body"):
+                    out[rec["custom_id"]] = Response.model_validate(r["body"])
+        return out
+    finally:
+        _delete_openai_files(client, batch.input_file_id, batch.output_file_id, batch.error_file_id)
+
+def _extract_via_batch(
+    client: openai.OpenAI,
+    batches: List[List[str]],
+    *,
+    model_name: str,
+    file: Optional[openai.types.FileObject] = None,
+    file_hash: Optional[str] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> Tuple[List[dict], List[List[str]]]:
+    """
+    mode='batch'：所有擷取批次一次送進 Batch API（半價、與即時呼叫分開的額度）。
+    回傳 (結果, 要改走即時呼叫的批次)：
+      - 回應快取命中的批次不送出
+      - 送出失敗時全部交回；逾時取消後只交回沒拿到輸出的批次（已完成的沿用）
+      - 單一請求失敗的批次原樣交回；被截斷的拆半後交回
+    Batch API 的結果帶 "batch": True（計價用）。
+    """
+    results: List[dict] = []
+    requests: Dict[str, List[str]] = {}
+    pending: Dict[str, Tuple[List[str], Optional[str]]] = {}
+    for idx, batch in enumerate(batches):
+        cache_key = _extract_cache_key(batch, model_name, file_hash)
+        if cache_key and (hit := _response_cache_get("extract", cache_key)) is not None:
+            results.append({**hit, "usage": {"input": 0, "cached_input": 0, "output": 0}, "truncated": False})
+            continue
+        cid = f"extract-{idx}"
+        requests[cid] = batch
+        pending[cid] = (batch, cache_key)
+    if not requests:
+        return results, []
+
+    try:
+        data = _extract_batch_jsonl(requests, model_name=model_name, file=file)
+        responses = _await_batch(
+            client,
+            _submit_batch_jsonl(client, data),
+            timeout=settings.OPENAI_BATCH_TIMEOUT,
+            should_stop=should_stop,
+        )
+    except openai.OpenAIError:
+        logger.exception("batch submission failed (file_hash=%s); falling back to sync calls", file_hash)
+        return results, [batch for batch, _ in pending.values()]
+
+    leftover: List[List[str]] = []
+    for cid, (batch, cache_key) in pending.items():
+        resp = responses.get(cid)
+        if resp is None:
+            leftover.append(batch)
+            continue
+        ex = _parse_extraction_response(resp, models=batch, model_name=model_name, cache_key=cache_key)
+        results.append({**ex, "batch": True})
+        if ex["truncated"] and len(batch) >= 2:
+            mid = len(batch) // 2
+            leftover += [batch[:mid], batch[mid:]]
+    return results, leftover
+
 # ────────────────────────────── 欄位轉換/差異判斷（依 schema） ──────────────────────────────
 from typing import Tuple, Optional, Dict, Any, List
 
@@ -308,6 +872,13 @@ def _norm_field(v: Optional[str]) -> Optional[str]:
     s = str(v).strip()
     return s if s else None
 
+# 「數值 + 單位」：允許 ±、數字與小數、單位字母/μ/% 等
+_UNIT_RE = re.compile(r"±?([\d.]+)\s*([a-zA-Zμ%]+)")
+
+def _strip_unit(value: str) -> Tuple[str, str]:
+    m = _UNIT_RE.match(value.strip())
+    return m.groups() if m else (value.strip(), "")
+
 def _join_with_unit_range(lower: Optional[str], upper: Optional[str]) -> Optional[str]:
     """
     嘗試把 lower/upper 轉成「{lower_val}~{upper_val} {unit}」。
@@ -316,160 +887,176 @@ def _join_with_unit_range(lower: Optional[str], upper: Optional[str]) -> Optiona
     if not lower or not upper:
         return None
 
-    def strip_unit(value: str):
-        # 允許 ±、數字與小數、單位字母/μ/% 等
-        m = re.match(r"±?([\d.]+)\s*([a-zA-Zμ%]+)", value.strip())
-        return m.groups() if m else (value.strip(), "")
-
-    l_val, l_unit = strip_unit(lower)
-    u_val, u_unit = strip_unit(upper)
+    l_val, l_unit = _strip_unit(lower)
+    u_val, u_unit = _strip_unit(upper)
     if l_unit and l_unit == u_unit:
         return f"{l_val}~{u_val} {l_unit}"
     return f"{lower}~{upper}"
 
-def _project_item_from_schema(raw: Dict[str, Any]) -> Tuple[str, Dict[str, Optional[str]], List[str]]:
+# (ModelItem 欄位, schema 欄位, 子欄位)：直接取單一值、只需正規化的欄位
+_VALUE_KEY_MAP: Tuple[Tuple[str, str, str], ...] = (
+    ("output_power", "Output Power", "value"),
+    ("package", "Package", "value"),
+    ("isolation", "I/O Isolation", "value"),
+    ("insulation", "Insulation System", "value"),
+)
+
+def _project_item_from_schema(raw: Dict[str, Any]) -> Tuple[str, Dict[str, Optional[str]], Dict[str, str]]:
     """
     從「擷取規格.json」的單一 model 物件轉成：
       - model_number: str
       - fields: Dict[str, Optional[str]]  對應 ModelItem 目前有的欄位
-      - apps: List[str]                   交給 ModelApplicationTag
+      - apps: Dict[str, str]              canon（trim + lower）→ 原始字串，已去重；交給 ModelApplicationTag
     不存在或空白就回 None / 空陣列。
     """
     model_number = _norm_field(raw.get("Model Number"))
+    fields: Dict[str, Optional[str]] = {}
 
-    # Input Voltage
-    iv = raw.get("Input Voltage", {}) or {}
-    input_voltage_range = _join_with_unit_range(_norm_field(iv.get("lower")), _norm_field(iv.get("upper")))
-    # 你目前 DB 沒有 input_voltage_nominal，所以這裡先不存 nominal
+    # Input Voltage（DB 沒有 input_voltage_nominal，nominal 先不存）
+    iv = raw.get("Input Voltage") or {}
+    fields["input_voltage_range"] = _join_with_unit_range(_norm_field(iv.get("lower")), _norm_field(iv.get("upper")))
 
     # Output Voltage
-    ov = raw.get("Output Voltage", {}) or {}
+    ov = raw.get("Output Voltage") or {}
     ov_value = _norm_field(ov.get("value"))
-    ov_dual  = bool(ov.get("dual_output"))
-    output_voltage = f"±{ov_value}" if (ov_value and ov_dual) else ov_value
+    fields["output_voltage"] = f"±{ov_value}" if (ov_value and ov.get("dual_output")) else ov_value
 
-    # Output Current（DB 目前沒有此欄位 → 不存）
-    # oc = raw.get("Output Current", {}) or {}
-
-    # Output Power
-    op = raw.get("Output Power", {}) or {}
-    output_power = _norm_field(op.get("value"))
-
-    # Package
-    pkg = raw.get("Package", {}) or {}
-    package = _norm_field(pkg.get("value"))
-
-    # I/O Isolation
-    iso = raw.get("I/O Isolation", {}) or {}
-    isolation = _norm_field(iso.get("value"))
-
-    # Insulation System
-    ins = raw.get("Insulation System", {}) or {}
-    insulation = _norm_field(ins.get("value"))
-
-    # Application → List[str]
-    app = raw.get("Application", {}) or {}
-    apps_raw = app.get("values") or []
-    apps: List[str] = [s.strip() for s in apps_raw if isinstance(s, str) and s.strip()]
+    # 單一 value 的欄位（Output Power / Package / I/O Isolation / Insulation System）
+    for col, src, attr in _VALUE_KEY_MAP:
+        fields[col] = _norm_field((raw.get(src) or {}).get(attr))
 
     # Dimension
-    dim = raw.get("Dimension", {}) or {}
+    dim = raw.get("Dimension") or {}
     length = _norm_field(dim.get("length"))
     width  = _norm_field(dim.get("width"))
     height = _norm_field(dim.get("height"))
-    if length and width and height:
-        dimension = f"{length} x {width} x {height}"
-    else:
-        dimension = None
-
-    # Efficiency（DB 目前沒有此欄位 → 不存）
-    # eff = raw.get("Efficiency", {}) or {}
-
-    fields: Dict[str, Optional[str]] = {
-        "input_voltage_range": input_voltage_range,
-        "output_voltage": output_voltage,
-        "output_power": output_power,
-        "package": package,
-        "isolation": isolation,
-        "insulation": insulation,
-        "dimension": dimension,
-    }
+    fields["dimension"] = f"{length} x {width} x {height}" if (length and width and height) else None
+
+    # Output Current / Efficiency：DB 目前沒有此欄位 → 不存
+
+    # Application → canon: 原始字串
+    apps: Dict[str, str] = {}
+    for s in (raw.get("Application") or {}).get("values") or []:
+        if isinstance(s, str) and (tag := s.strip()):
+            apps.setdefault(tag.lower(), tag)
+
     return model_number or "", fields, apps
 
 def _fields_changed(mi: ModelItem, new_fields: Dict[str, Optional[str]]) -> bool:
-    for col, new_val in new_fields.items():
-        old_val = getattr(mi, col, None)
-        if _norm_field(old_val) != _norm_field(new_val):
-            return True
-    return False
-
-def _apps_changed(mi: ModelItem, new_apps: List[str]) -> bool:
-    old_set = {t.app_tag_canon for t in (mi.applications or [])}
-    new_set = {a.lower().strip() for a in new_apps if a and a.strip()}
-    return old_set != new_set
+    # 兩邊都已是正規化後的值（strip、空字串 → None），直接比較即可：
+    #   - new_fields 由 _project_item_from_schema 組出，每個欄位都經過 _norm_field
+    #   - ModelItem 欄位只經由 _upsert_model_and_apps（_norm_field）與 routers/models.py（_norm）寫入
+    return any(getattr(mi, col, None) != new_val for col, new_val in new_fields.items())
+
+def _apps_changed(mi: ModelItem, new_apps: Dict[str, str]) -> bool:
+    return {t.app_tag_canon for t in (mi.applications or [])} != new_apps.keys()
+
+# IN (...) 查詢分塊，避免超過 SQLite 單一語句的參數上限
+_PREFETCH_CHUNK = 500
+
+def _prefetch_model_items(db: Session, model_numbers: List[str]) -> Dict[str, ModelItem]:
+    """一次撈出既有的 ModelItem（連同 applications，selectinload），取代逐筆查詢 + lazy load。"""
+    unique = list(dict.fromkeys(model_numbers))
+    existing: Dict[str, ModelItem] = {}
+    for i in range(0, len(unique), _PREFETCH_CHUNK):
+        rows = (
+            db.query(ModelItem)
+            .options(selectinload(ModelItem.applications))
+            .filter(ModelItem.model_number.in_(unique[i:i + _PREFETCH_CHUNK]))
+            .all()
+        )
+        existing.update((mi.model_number, mi) for mi in rows)
+    return existing
 
 def _upsert_model_and_apps(
     db: Session,
+    existing: Dict[str, ModelItem],
     model_number: str,
     fields: Dict[str, Optional[str]],
-    apps: List[str],
+    apps: Dict[str, str],
 ) -> tuple[ModelItem, bool]:
     """
     以 model_number upsert ModelItem；只在「資料真的變動」時覆寫。
+    existing 為 _prefetch_model_items 的結果；新建的 ModelItem 也會放進去（同批重複型號沿用同一筆）。
     變動規則：
       - 欄位或 tags 任一不同 → 視為變動
       - 若原 verify_status 為 'verified'，變動時改回 'unverified' 並清 reviewer/reviewed_at
     回傳：(ModelItem, changed_any)
     """
-    mi = db.query(ModelItem).filter_by(model_number=model_number).one_or_none()
+    mi = existing.get(model_number)
     is_new = mi is None
     if mi is None:
         mi = ModelItem(model_number=model_number, verify_status="unverified")
         db.add(mi)
+        existing[model_number] = mi
+
+    # 沒有變動：直接返回，不碰任何屬性（避免進入 dirty tracking / 多餘的 flush）
+    if not is_new and not _fields_changed(mi, fields) and not _apps_changed(mi, apps):
+        return mi, False
+
+    # 覆寫欄位
+    for col, val in fields.items():
+        setattr(mi, col, _norm_field(val))
+
+    # Applications 全量替換（刪除不存在、補新增）
+    old = {t.app_tag_canon: t for t in (mi.applications or [])}
+    to_delete = old.keys() - apps.keys()
+    to_add    = apps.keys() - old.keys()
+
+    # 刪除：一條 DELETE；session 內的集合直接換成保留的部分（不觸發 delete-orphan 再刪一次）
+    if to_delete:
+        db.execute(
+            delete(ModelApplicationTag)
+            .where(ModelApplicationTag.model_number == mi.model_number)
+            .where(ModelApplicationTag.app_tag_canon.in_(to_delete)),
+            execution_options={"synchronize_session": False},
+        )
+        set_committed_value(mi, "applications", [t for c, t in old.items() if c not in to_delete])
 
-    fields_diff = _fields_changed(mi, fields)
-    apps_diff   = _apps_changed(mi, apps)
-    changed_any = is_new or fields_diff or apps_diff
-
-    if changed_any:
-        # 覆寫欄位
-        for col, val in fields.items():
-            setattr(mi, col, _norm_field(val))
-
-        # Applications 全量替換（刪除不存在、補新增）
-        old = {t.app_tag_canon: t for t in (mi.applications or [])}
-        new_canon = {t.lower().strip() for t in apps if t and t.strip()}
-
-        # 刪除
-        for canon, row in list(old.items()):
-            if canon not in new_canon:
-                db.delete(row)
+    # 新增
+    db.add_all([ModelApplicationTag(model=mi, app_tag=apps[c], app_tag_canon=c) for c in to_add])
 
-        # 新增
-        for tag in apps:
-            canon = tag.lower().strip()
-            if canon and canon not in old:
-                db.add(ModelApplicationTag(model=mi, app_tag=tag, app_tag_canon=canon))
+    # 審核狀態：verified → unverified
+    if mi.verify_status == "verified":
+        mi.verify_status = "unverified"
+        mi.reviewer = None
+        mi.reviewed_at = None
 
-        # 審核狀態：verified → unverified
-        if mi.verify_status == "verified":
-            mi.verify_status = "unverified"
-            mi.reviewer = None
-            mi.reviewed_at = None
+    return mi, True
 
-    return mi, changed_any
+# SQLite 單一語句的參數上限為 32766；每列 2 個參數，分塊保守一點
+_LINK_INSERT_CHUNK = 500
 
-def _ensure_file_model_link(db: Session, file_hash: str, model_number: str):
+def _link_file_models(db: Session, file_hash: str, model_numbers: List[str], *, replace: bool = False) -> None:
     """
-    確保 (file_hash, model_number) 的出現關聯存在。
+    批次建立 (file_hash, model_number) 的出現關聯。
+    - 先一次撈出本檔案既有的關聯，只 INSERT 缺的（ON CONFLICT DO NOTHING 兜底併發寫入）
+    - replace=True：順便刪掉這次沒出現的型號（只刪差集，不先清空再重建）
     """
-    exists = (
-        db.query(FileModelAppearance)
-        .filter_by(file_hash=file_hash, model_number=model_number)
-        .one_or_none()
-    )
-    if exists is None:
-        db.add(FileModelAppearance(file_hash=file_hash, model_number=model_number))
+    wanted = dict.fromkeys(model_numbers)
+    have = set(db.scalars(select(FileModelAppearance.model_number).where(FileModelAppearance.file_hash == file_hash)))
+
+    if replace:
+        stale = [mn for mn in have if mn not in wanted]
+        for i in range(0, len(stale), _LINK_INSERT_CHUNK):
+            db.execute(
+                delete(FileModelAppearance)
+                .where(FileModelAppearance.file_hash == file_hash)
+                .where(FileModelAppearance.model_number.in_(stale[i:i + _LINK_INSERT_CHUNK])),
+                execution_options={"synchronize_session": False},
+            )
+
+    rows = [{"file_hash": file_hash, "model_number": mn} for mn in wanted if mn not in have]
+    if not rows:
+        return
+    # session 不會 autoflush：新的 ModelItem 要先寫入，FK 才過得了
+    db.flush()
+    for i in range(0, len(rows), _LINK_INSERT_CHUNK):
+        db.execute(
+            sqlite_insert(FileModelAppearance)
+            .values(rows[i:i + _LINK_INSERT_CHUNK])
+            .on_conflict_do_nothing(index_elements=["file_hash", "model_number"])
+        )
 
 # ────────────────────────────── 主流程：擷取 ──────────────────────────────
 
@@ -481,6 +1068,7 @@ def extract_with_openai(
     model_name: str = "gpt-5",
     service_tier: Optional[Literal["auto", "default", "flex", "priority", "scale"]] = None,
     mode: str = "sync",  # 'sync' / 'batch' / 'background'
+    should_stop: Optional[Callable[[], bool]] = None,  # 呼叫端中止時回傳 True（目前用於 Batch API 的輪詢）
 ) -> dict:
     """
     回傳 dict:
@@ -491,7 +1079,8 @@ def extract_with_openai(
         "completion_tokens": int,    # output
         "model": str,
         "service_tier": str|None,
-        "usage": {"input": int, "cached_input": int, "output": int}
+        "usage": {"input": int, "cached_input": int, "output": int},
+        "cache_hit_rate": float,     # cached_input / (input + cached_input)，觀察 prompt caching 是否退化
     }
     """
     fa: FileAsset = db.get(FileAsset, file_hash)
@@ -513,18 +1102,17 @@ def extract_with_openai(
             "model": None,
             "service_tier": None,
             "usage": {"input": 0, "cached_input": 0, "output": 0},
+            "cache_hit_rate": 0.0,
             "status": "canceled"
         }
 
-    client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-    file = None
+    client = _client_for(settings.OPENAI_API_KEY)
     total_usage = {"input": 0, "cached_input": 0, "output": 0}
     actual_model: str = model_name
     actual_tier: Optional[Literal["auto", "default", "flex", "priority", "scale"]] = service_tier
 
     try:
-        data = Path(fa.local_path).read_bytes()
-        file = client.files.create(file=(fa.filename or "datasheet.pdf", data), purpose="assistants")
+        file = _ensure_openai_file(client, db, fa)
 
         # 1) 取得型號清單
         gm = _get_model_numbers(
@@ -532,57 +1120,94 @@ def extract_with_openai(
             model_name=model_name,
             service_tier=service_tier,
             file=file,
+            file_hash=file_hash,
         )
         total_usage = _acc(total_usage, gm["usage"])
         actual_model = gm["model"] or actual_model
         actual_tier  = gm["service_tier"] or actual_tier
-        models_list: List[str] = gm["models"]
-
-        # 2) 分批擷取
-        batch_size = 10
-        model_batches = [models_list[i:i + batch_size] for i in range(0, len(models_list), batch_size)]
+        models_list = _dedupe_models(gm["models"], file_hash)
+
+        # 2) 分批擷取（批次間並行；此函式跑在 worker 執行緒，沒有既有 event loop）
+        #    批次大一點：instructions + 檔案只需處理一次；輸出被截斷時才自動拆半
+        #    mode='batch'：型號清單要先拿到才能組擷取請求，所以上一步仍是即時呼叫；擷取批次一次送進 Batch API，
+        #    逾時或失敗的批次再退回即時呼叫
+        results: List[dict] = []
+        if models_list:
+            pending: Iterable[List[str]] = _chunks(models_list, max(1, settings.EXTRACTION_BATCH_SIZE))
+            if mode == "batch":
+                results, pending = _extract_via_batch(
+                    client,
+                    list(pending),
+                    model_name=model_name,
+                    file=file,
+                    file_hash=file_hash,
+                    should_stop=should_stop,
+                )
+            if pending:
+                results += asyncio.run(_extract_batches(
+                    pending,
+                    model_name=model_name,
+                    service_tier=service_tier,
+                    file=file,
+                    file_hash=file_hash,
+                ))
         merged: List[Dict[str, Any]] = []
-        for batch in model_batches:
-            if not batch:
-                continue
-            ex = _run_extraction(
-                client,
-                models=batch,
-                model_name=model_name,
-                service_tier=service_tier,
-                file=file,
-            )
+        batch_usage = {"input": 0, "cached_input": 0, "output": 0}
+        for ex in results:
             total_usage = _acc(total_usage, ex["usage"])
+            if ex.get("batch"):
+                batch_usage = _acc(batch_usage, ex["usage"])
             actual_model = ex["model"] or actual_model
             actual_tier  = ex["service_tier"] or actual_tier
             merged.extend(ex["items"])
-
-        # 3) 寫出聚合結果 JSON
+        if mode == "batch":
+            # 退回即時呼叫的批次會排在後面：依型號清單順序重排
+            order = {mn: i for i, mn in enumerate(models_list)}
+            merged.sort(key=lambda it: order.get(it.get("Model Number"), len(order)))
+
+        # 3) 更新 DB（差異比對；只在變動時 unverified；並建立 FileModelAppearance）
+        #    型號、標籤、出現關聯（含 force_rerun 的刪除）同一個交易、一次 commit；失敗整批 rollback，
+        #    不留半套資料，呼叫端標記任務失敗時拿到的也是乾淨的 session
         resp_obj = {"models": merged, "file_hash": file_hash, "generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat()}
-        out_path.write_text(json.dumps(resp_obj, ensure_ascii=False, indent=2), encoding="utf-8")
-
-        # 4) 更新 DB（差異比對；只在變動時 unverified；並建立 FileModelAppearance）
-        if force_rerun:
-            # 重新整理本檔案的出現關聯（不刪 ModelItem 本體）
-            db.query(FileModelAppearance).filter_by(file_hash=file_hash).delete()
+        out_bytes = orjson.dumps(resp_obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        try:
+            # 同一型號可能在多個批次重複出現：以最後一次為準（dict 保留首次出現的順序），
+            # 否則前一次新增、尚未 flush 的標籤躲過批次 DELETE，完整取代會變成聯集
+            projected = list({p[0]: p for p in map(_project_item_from_schema, merged) if p[0]}.values())
+            existing = _prefetch_model_items(db, [mn for mn, _, _ in projected])
+
+            upserted_model_numbers: List[str] = []
+            for model_number, fields, apps in projected:
+                mi, _changed = _upsert_model_and_apps(db, existing, model_number, fields, apps)
+                upserted_model_numbers.append(model_number)
+
+            # force_rerun：重新整理本檔案的出現關聯（不刪 ModelItem 本體）
+            _link_file_models(db, file_hash, upserted_model_numbers, replace=force_rerun)
             db.commit()
+        except Exception:
+            db.rollback()
+            raise
 
-        upserted_model_numbers: List[str] = []
-        for item in merged:
-            model_number, fields, apps = _project_item_from_schema(item)
-            if not model_number:
-                continue
-
-            mi, _changed = _upsert_model_and_apps(db, model_number, fields, apps)
-            _ensure_file_model_link(db, file_hash, model_number)
-            upserted_model_numbers.append(model_number)
-
-        db.commit()
+        # 4) 寫出聚合結果 JSON：out_path 存在即視為已擷取（之後非強制重跑會直接略過），
+        #    所以一定在 DB commit 成功之後才寫；先寫暫存檔再 os.replace，中途失敗不會留下半個檔案
+        tmp_path = out_path.with_name(f".{out_path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            tmp_path.write_bytes(out_bytes)
+            os.replace(tmp_path, out_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
 
         # 5) 計價與回傳
-        cost_usd = _calc_cost(actual_model, total_usage, mode, actual_tier)
+        # 只有實際走 Batch API 的用量半價；型號清單與退回即時呼叫的部分照即時計價
+        direct_usage = {k: total_usage[k] - batch_usage[k] for k in total_usage}
+        cost_usd = round(
+            _calc_cost(actual_model, batch_usage, "batch")
+            + _calc_cost(actual_model, direct_usage, "sync" if mode == "batch" else mode, actual_tier),
+            6,
+        )
         prompt_total = total_usage["input"] + total_usage["cached_input"]
         completion_total = total_usage["output"]
+        _log_cache_usage(f"file {file_hash[:12]}", total_usage)
 
         return {
             "out_path": str(out_path),
@@ -592,19 +1217,14 @@ def extract_with_openai(
             "model": actual_model,
             "service_tier": actual_tier,
             "usage": total_usage,
+            "cache_hit_rate": round(_cache_hit_rate(total_usage), 4),
             "status": "succeeded"
         }
 
     except Exception:
-        traceback.print_exc()
+        logger.exception(
+            "extract_with_openai failed (file_hash=%s)", file_hash,
+            extra={"file_hash": file_hash, "model_name": model_name},
+        )
         raise
-    finally:
-        try:
-            if file:
-                client.files.delete(file.id)
-        except Exception:
-            pass
-        try:
-            client.close()
-        except Exception:
-            pass
+    # 上傳的檔案保留給之後重跑沿用（到期由 OpenAI 端處理）；client 為共用連線池，這裡都不關
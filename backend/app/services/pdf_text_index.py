@@ -1,36 +1,76 @@
 from __future__ import annotations
-from typing import List, Dict
-from pypdf import PdfReader
+from typing import List, Dict, Optional
 from functools import lru_cache
+import os
+
+import fitz  # PyMuPDF
 
 def build_page_index(pdf_path: str) -> List[str]:
-    reader = PdfReader(pdf_path)
+    # 文字抽取交給 MuPDF（C 實作），比純 Python 的 pypdf 快一個數量級
+    # PyMuPDF 的 document 不是 thread-safe，逐頁依序抽取
     pages: List[str] = []
-    for i, p in enumerate(reader.pages):
-        try:
-            pages.append(p.extract_text() or "")
-        except Exception:
-            pages.append("")
+    with fitz.open(pdf_path) as doc:
+        for p in doc:
+            try:
+                pages.append(p.get_text() or "")
+            except Exception:
+                pages.append("")
     return pages
 
 @lru_cache(maxsize=128)
-def build_page_index_cached(pdf_path: str) -> List[str]:
+def _page_index(pdf_path: str, mtime_ns: int, size: int) -> List[str]:
+    """程序內快取。鍵含 mtime / size，檔案被換掉時自然失效。"""
     return build_page_index(pdf_path)
 
-def search_pages(pages: List[str], keyword: str, limit: int=10) -> List[Dict]:
+@lru_cache(maxsize=128)
+def _page_lower_index(pdf_path: str, mtime_ns: int, size: int) -> List[str]:
+    # 每個程序對每份檔案只 lower() 一次
+    return [t.lower() for t in _page_index(pdf_path, mtime_ns, size)]
+
+def _cache_key(pdf_path: str):
+    # realpath 正規化：'./a.pdf'、'a.pdf'、絕對路徑、symlink 共用同一個快取槽
+    real = os.path.realpath(pdf_path)
+    st = os.stat(real)
+    return real, st.st_mtime_ns, st.st_size
+
+def build_page_index_cached(pdf_path: str) -> List[str]:
+    return _page_index(*_cache_key(pdf_path))
+
+def build_page_lower_index_cached(pdf_path: str) -> List[str]:
+    """與 build_page_index_cached 對齊的小寫版本，重複搜尋同一份文件時不必每次 lower()。"""
+    return _page_lower_index(*_cache_key(pdf_path))
+
+def page_index_cache_info():
+    """觀測用：程序內原文快取的 lru_cache 統計（hits / misses / currsize）。"""
+    return _page_index.cache_info()
+
+def clear_page_index_cache() -> None:
+    """清空程序內快取（原文與小寫版）。"""
+    _page_index.cache_clear()
+    _page_lower_index.cache_clear()
+
+def search_pages(
+    pages: List[str],
+    keyword: str,
+    limit: int = 10,
+    pages_lower: Optional[List[str]] = None,
+) -> List[Dict]:
+    """
+    逐頁找 keyword（不分大小寫），回傳命中頁碼與前後 50 字的片段。
+    pages_lower：可傳入 build_page_lower_index_cached 的結果，省掉每頁的 lower()；未傳入時每次呼叫都會逐頁 lower()。
+    """
     res = []
-    k = keyword.strip()
-    if not k:
+    kl = keyword.strip().lower()
+    if not kl:
         return res
-    for idx, text in enumerate(pages, start=1):
-        tl = (text or "").lower()
-        kl = k.lower()
-        if kl in tl:
-            pos = tl.find(kl)
-            start = max(0, pos-50)
-            end = min(len(text), pos+50)
-            snippet = text[start:end]
-            res.append({"page": idx, "snippet": snippet})
-            if len(res) >= limit:
-                break
+    lowered = pages_lower if pages_lower is not None else ((t or "").lower() for t in pages)
+    for idx, (text, tl) in enumerate(zip(pages, lowered), start=1):
+        pos = tl.find(kl)
+        if pos < 0:
+            continue
+        start = max(0, pos-50)
+        end = min(len(text), pos+50)
+        res.append({"page": idx, "snippet": text[start:end]})
+        if len(res) >= limit:
+            break
     return res
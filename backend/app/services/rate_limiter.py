@@ -0,0 +1,88 @@
+# backend/app/services/rate_limiter.py
+from __future__ import annotations
+
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Mapping
+import asyncio
+import threading
+import time
+
+class RateLimiter:
+    """
+    RPM / TPM 雙 token bucket（主動限速，避免併發時盲撞 429）。
+    - 額度每秒回補 rpm/60、tpm/60，上限為一分鐘的量
+    - 執行緒安全：擷取 worker 的多個執行緒（各自的 event loop）共用同一組額度
+    - rpm / tpm <= 0 表示不限制該項
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        self._rpm = float(rpm)
+        self._tpm = float(tpm)
+        self._requests = self._rpm
+        self._tokens = self._tpm
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _try_take(self, tokens: int) -> float:
+        """額度足夠就扣掉並回傳 0；否則回傳建議等待的秒數。"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+
+            elapsed = now - self._last
+            self._last = now
+            if self._rpm > 0:
+                self._requests = min(self._rpm, self._requests + elapsed * self._rpm / 60.0)
+            if self._tpm > 0:
+                self._tokens = min(self._tpm, self._tokens + elapsed * self._tpm / 60.0)
+                tokens = min(tokens, int(self._tpm))  # 單一請求超過 TPM 時，等到滿桶就放行
+
+            req_ok = self._rpm <= 0 or self._requests >= 1
+            tok_ok = self._tpm <= 0 or self._tokens >= tokens
+            if req_ok and tok_ok:
+                if self._rpm > 0:
+                    self._requests -= 1
+                if self._tpm > 0:
+                    self._tokens -= tokens
+                return 0.0
+
+            wait_req = 0.0 if req_ok else (1 - self._requests) * 60.0 / self._rpm
+            wait_tok = 0.0 if tok_ok else (tokens - self._tokens) * 60.0 / self._tpm
+            return max(wait_req, wait_tok, 0.01)
+
+    async def acquire(self, tokens: int) -> None:
+        """等到 1 個請求額度 + tokens 個 token 額度都足夠（不阻塞 event loop）。"""
+        while (wait := self._try_take(tokens)) > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, tokens: int) -> None:
+        """同步版 acquire（給同步 client 呼叫端）。"""
+        while (wait := self._try_take(tokens)) > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """伺服器回 429 時整桶暫停，讓其他併發請求一起退讓。"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + max(0.0, seconds))
+
+def retry_after_seconds(headers: Mapping[str, str], default: float = 1.0) -> float:
+    """解析 429 回應的 retry-after-ms / retry-after（秒數或 HTTP-date）。"""
+    ms = headers.get("retry-after-ms")
+    if ms:
+        try:
+            return float(ms) / 1000.0
+        except ValueError:
+            pass
+    ra = headers.get("retry-after")
+    if ra:
+        try:
+            return float(ra)
+        except ValueError:
+            try:
+                return max(0.0, (parsedate_to_datetime(ra) - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+    return default
@@ -11,6 +11,16 @@ class Settings(BaseSettings):
     PORT: int = 8000
     DEBUG: bool = True
     DEBUG_DEVTOOLS: bool = False
+    DOWNLOADER_MAX_CONCURRENCY: int = 3
+    EXTRACTOR_MAX_CONCURRENCY: int = 1
+    MAX_DATASHEET_BYTES: int = 200 * 1024 * 1024  # 單一下載檔案上限
+    OPENAI_MAX_CONCURRENCY: int = 6  # 單一檔案擷取時，同時送出的批次請求數
+    OPENAI_RPM: int = 500            # 主動限速：每分鐘請求數（<= 0 不限制）
+    OPENAI_TPM: int = 500_000        # 主動限速：每分鐘 token 數（<= 0 不限制）
+    EXTRACTION_BATCH_SIZE: int = 40  # 每次擷取請求包含的型號數（輸出被截斷時自動拆半）
+    MAX_MODELS_PER_FILE: int = 500   # 單一檔案擷取的型號數上限（<= 0 不限制）
+    OPENAI_RESPONSE_CACHE: bool = False  # 相同輸入（檔案/指令/schema/模型）重用上次的回應，不呼叫 API
+    OPENAI_BATCH_TIMEOUT: int = 3600  # mode='batch' 等候 Batch API 完成的上限秒數；逾時取消，已完成的請求沿用，其餘改用即時呼叫
 
     class Config:
         env_file = ".env"
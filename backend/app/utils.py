@@ -1,9 +1,12 @@
 # backend/app/utils.py
 import json
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional
 from datetime import datetime, timezone
 
+import orjson
+from fastapi import Response
+
 class Utils:
     @staticmethod
     def human_size(n: int | None) -> str:
@@ -24,6 +27,14 @@ class Utils:
         num = f"{val:.1f}".rstrip("0").rstrip(".")
         return f"{num} {units[i]}"
 
+    @staticmethod
+    def orjson_response(content: Any) -> Response:
+        """以 orjson 直接序列化成 JSON Response（datetime 走原生路徑；naive 視為 UTC）"""
+        return Response(
+            content=orjson.dumps(content, option=orjson.OPT_NAIVE_UTC),
+            media_type="application/json",
+        )
+
     @staticmethod
     def setup_devtools_static(wk_dir: Path, project_root: Path) -> None:
         """DevTools helper"""
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 讓測試以 backend.app.* 匯入（與 uvicorn backend.app.main:app 相同的套件路徑）
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,20 @@
+import fitz  # PyMuPDF
+
+from backend.app.services import pdf_text_index as m
+
+def test_page_index_cache_normalizes_paths_and_clears(tmp_path, monkeypatch):
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Hello World")
+    doc.save(str(tmp_path / "a.pdf"))
+    monkeypatch.chdir(tmp_path)
+
+    m.clear_page_index_cache()
+    pages = m.build_page_index_cached("a.pdf")
+    assert m.build_page_index_cached("./a.pdf") == pages
+    assert m.build_page_index_cached(str(tmp_path / "a.pdf")) == pages
+    info = m.page_index_cache_info()
+    assert (info.misses, info.hits, info.currsize) == (1, 2, 1)
+    assert m.build_page_lower_index_cached("a.pdf") == [p.lower() for p in pages]
+
+    m.clear_page_index_cache()
+    assert m.page_index_cache_info().currsize == 0